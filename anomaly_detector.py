@@ -0,0 +1,172 @@
+import math
+from collections import deque, namedtuple
+import numpy as np
+from quantime_recorder import read_recording
+from rolling_stats import RollingWindow
+
+AnomalyEvent = namedtuple("AnomalyEvent", "kind field seq timestamp value score source", defaults=(None,))
+
+SIDES = {"up": (1.0,), "down": (-1.0,), "both": (1.0, -1.0)}
+
+def _upcrossings(active):
+    # Events fire when a condition becomes true, not on every sample it holds.
+    return active & ~np.concatenate(([False], active[:-1]))
+
+class FieldDetector:
+    # Three detectors on one field, each firing on upcrossings of its score:
+    #   zscore       (x - mean) / std against the previous `window` samples
+    #   cusum        one-sided CUSUM of those z-scores with slack k, limit h
+    #                (no reset after an alarm, so batch mode can use the
+    #                Lindley form S_t = C_t - min(0, min C_<=t))
+    #   changepoint  Welch-style t statistic between the means of the last
+    #                two `cp_window` blocks
+    # update() and batch() compute the same statistics, so a backtest over a
+    # recording reproduces what the live stage would have reported.
+    def __init__(self, direction="both", window=256, z_threshold=4.0, cusum_k=0.5, cusum_h=15.0,
+                 cp_window=64, cp_threshold=6.0, min_std=1e-6):
+        self.sides = SIDES[direction]
+        self.window = window
+        self.z_threshold = z_threshold
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.cp_window = cp_window
+        self.cp_threshold = cp_threshold
+        self.min_std = min_std
+        self.baseline = RollingWindow(window)
+        self.cusum = [0.0] * len(self.sides)
+        self.active = {}
+        self.recent = deque()
+        self.prior = deque()
+        self.sums = [0.0, 0.0, 0.0, 0.0]
+
+    def _fire(self, key, condition):
+        fired = condition and not self.active.get(key, False)
+        self.active[key] = condition
+        return fired
+
+    def update(self, value):
+        events = []
+        baseline = self.baseline
+        if baseline.count == self.window:
+            z = (value - baseline.mean) / max(baseline.std, self.min_std)
+            for i, side in enumerate(self.sides):
+                if self._fire(("zscore", side), side * z > self.z_threshold):
+                    events.append(("zscore", z))
+                self.cusum[i] = s = max(0.0, self.cusum[i] + side * z - self.cusum_k)
+                if self._fire(("cusum", side), s > self.cusum_h):
+                    events.append(("cusum", side * s))
+        baseline.add(value)
+        d = self._changepoint(value)
+        if d is not None:
+            for side in self.sides:
+                if self._fire(("changepoint", side), side * d > self.cp_threshold):
+                    events.append(("changepoint", d))
+        return events
+
+    def _changepoint(self, value):
+        w, sums = self.cp_window, self.sums
+        self.recent.append(value)
+        sums[0] += value
+        sums[1] += value * value
+        if len(self.recent) > w:
+            moved = self.recent.popleft()
+            self.prior.append(moved)
+            sums[0] -= moved
+            sums[1] -= moved * moved
+            sums[2] += moved
+            sums[3] += moved * moved
+            if len(self.prior) > w:
+                dropped = self.prior.popleft()
+                sums[2] -= dropped
+                sums[3] -= dropped * dropped
+        if len(self.prior) < w:
+            return None
+        recent, recent_sq, prior, prior_sq = sums
+        variance = (recent_sq - recent * recent / w + prior_sq - prior * prior / w) / w
+        return (recent - prior) / w / max(math.sqrt(max(variance, 0.0) / w), self.min_std)
+
+    def _t_stats(self, recent, recent_sq, prior, prior_sq):
+        w = self.cp_window
+        variance = (recent_sq - recent * recent / w + prior_sq - prior * prior / w) / w
+        return (recent - prior) / w / np.maximum(np.sqrt(np.maximum(variance, 0.0) / w), self.min_std)
+
+    def batch(self, values):
+        # Vectorised over a whole column, starting from a fresh detector.
+        # Returns (index, kind, score) sorted by index.
+        x = np.asarray(values, np.float64)
+        n, w, cw = len(x), self.window, self.cp_window
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        c2 = np.concatenate(([0.0], np.cumsum(x * x)))
+        found = []
+        if n > w:
+            s = c[w:n] - c[:n - w]
+            s2 = c2[w:n] - c2[:n - w]
+            std = np.sqrt(np.maximum((s2 - s * s / w) / (w - 1), 0.0))
+            z = np.zeros(n)
+            z[w:] = (x[w:] - s / w) / np.maximum(std, self.min_std)
+            valid = np.arange(n) >= w
+            for side in self.sides:
+                for i in np.flatnonzero(_upcrossings(valid & (side * z > self.z_threshold))):
+                    found.append((i, "zscore", z[i]))
+                steps = np.cumsum(np.where(valid, side * z - self.cusum_k, 0.0))
+                cusum = steps - np.minimum(np.minimum.accumulate(steps), 0.0)
+                for i in np.flatnonzero(_upcrossings(cusum > self.cusum_h)):
+                    found.append((i, "cusum", side * cusum[i]))
+        if n >= 2 * cw:
+            end = np.arange(2 * cw, n + 1)
+            d = np.full(n, np.nan)
+            d[2 * cw - 1:] = self._t_stats(c[end] - c[end - cw], c2[end] - c2[end - cw],
+                                           c[end - cw] - c[end - 2 * cw], c2[end - cw] - c2[end - 2 * cw])
+            for side in self.sides:
+                for i in np.flatnonzero(_upcrossings(side * d > self.cp_threshold)):
+                    found.append((i, "changepoint", d[i]))
+        found.sort(key=lambda event: event[0])
+        return found
+
+class AnomalyDetector:
+    # Stream stage: call it with each frame (it is a run_quantime_stream
+    # sink). Events go to `on_event`, or are kept in `events` when no
+    # callback is given. A fan-in stream interleaves nodes, so each
+    # frame["source"] gets its own baselines (`detectors[source]`).
+    def __init__(self, fields=None, on_event=None, history=1000, **options):
+        fields = fields or {"coherence": "down", "entropy": "up"}
+        self.options = options
+        self.fields = fields
+        self.detectors = {}
+        self.events = deque(maxlen=history)
+        self.on_event = on_event or self.events.append
+
+    def __call__(self, frame):
+        source = frame.get("source")
+        detectors = self.detectors.get(source)
+        if detectors is None:
+            detectors = self.detectors[source] = {field: FieldDetector(direction, **self.options)
+                                                  for field, direction in self.fields.items()}
+        for field, detector in detectors.items():
+            value = frame[field]
+            for kind, score in detector.update(value):
+                self.on_event(AnomalyEvent(kind, field, frame.get("seq"), frame.get("timestamp"), value, score,
+                                           source))
+
+    def backtest(self, timestamps, seqs, **columns):
+        events = []
+        for field, direction in self.fields.items():
+            values = np.asarray(columns[field], np.float64)
+            detector = FieldDetector(direction, **self.options)
+            events.extend(AnomalyEvent(kind, field, int(seqs[i]), float(timestamps[i]), float(values[i]), float(score))
+                          for i, kind, score in detector.batch(values))
+        events.sort(key=lambda event: (event.timestamp, event.seq))
+        return events
+
+    def backtest_recording(self, path):
+        records = read_recording(path)
+        return self.backtest(records["timestamp"], records["seq"],
+                             **{field: records[field] for field in self.fields})
+
+def format_event(event):
+    # seq and timestamp are None for frames that do not carry them.
+    source = "" if event.source is None else f"source={event.source} "
+    seq = "" if event.seq is None else f"seq={event.seq} "
+    timestamp = "" if event.timestamp is None else f"t={event.timestamp:.6f} "
+    return (f"{event.kind:11s} {event.field:9s} {source}{seq}{timestamp}"
+            f"value={event.value:.4f} score={event.score:+.2f}")
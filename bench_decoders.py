@@ -0,0 +1,30 @@
+import json, sys, time
+import stream_bridge
+from stream_bridge import DECODERS, encode_binary, msgpack
+
+def payloads(n):
+    frames = [{"timestamp": time.time() + i, "seq": i, "entropy": (i % 100) / 100, "coherence": 0.5} for i in range(n)]
+    yield "json", [json.dumps(f) for f in frames]
+    yield "stdlib-json", [json.dumps(f) for f in frames]
+    if msgpack:
+        yield "msgpack", [msgpack.packb(f) for f in frames]
+    yield "binary", [encode_binary(f["timestamp"], f["seq"], f["entropy"], f["coherence"]) for f in frames]
+
+def bench(n=100_000, repeat=5):
+    results = {}
+    for name, messages in payloads(n):
+        decode = DECODERS[name]
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for message in messages:
+                decode(message)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best / n * 1e9
+    return results
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"json backend: {'orjson' if stream_bridge.orjson else 'stdlib'}")
+    for name, ns in bench(n).items():
+        print(f"{name:12s} {ns:8.1f} ns/frame")
@@ -0,0 +1,67 @@
+import os, sys, time
+os.environ.setdefault("QUANTIME_HEADLESS", "1")
+import numpy as np
+import shader_visualizer as sv
+from shader_visualizer import gl
+
+def grid(count, width, height):
+    columns = min(max(round(np.sqrt(count * width / height)), 1), count)
+    return columns, -(-count // columns)
+
+def bench_instanced(count, width, height, frames):
+    states = sv.StreamStates(count)
+    visualizer = sv.Visualizer(width, height, tiles=states)
+    values = np.random.default_rng(0).random((frames, count, 2), np.float32)
+
+    def frame(i):
+        states.values[:] = values[i]
+        visualizer.draw()
+
+    return visualizer, frame
+
+def bench_per_tile(count, width, height, frames):
+    # The alternative: one viewport, uniform set and draw per stream.
+    visualizer = sv.Visualizer(width, height)
+    values = np.random.default_rng(0).random((frames, count, 2), np.float32).tolist()
+    columns, rows = grid(count, width, height)
+    cell_w, cell_h = width // columns, height // rows
+    viewports = [(i % columns * cell_w, height - (i // columns + 1) * cell_h) for i in range(count)]
+    visualizer.resize(cell_w, cell_h)
+
+    def frame(i):
+        for (x, y), (entropy, coherence) in zip(viewports, values[i]):
+            gl.glViewport(x, y, cell_w, cell_h)
+            visualizer.set_state(entropy, coherence)
+            visualizer.draw()
+
+    return visualizer, frame
+
+def bench(counts=(16, 256, 1024, 4096), width=800, height=600, frames=60):
+    context = sv.HeadlessContext()
+    framebuffer = sv.Framebuffer(width, height)
+    framebuffer.bind()
+    try:
+        results = {}
+        for count in counts:
+            for name, setup in (("instanced", bench_instanced), ("per-tile", bench_per_tile)):
+                framebuffer.bind()
+                visualizer, frame = setup(count, width, height, frames)
+                frame(0)
+                gl.glFinish()
+                cpu, wall = time.process_time(), time.perf_counter()
+                for i in range(frames):
+                    frame(i)
+                    gl.glFinish()
+                cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+                visualizer.delete()
+                results[count, name] = (cpu / frames * 1e3, wall / frames * 1e3)
+        return results
+    finally:
+        framebuffer.delete()
+        context.release()
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    print(f"{'tiles':>6s} {'path':9s} {'cpu ms/frame':>12s} {'wall ms/frame':>13s} {'fps':>7s}")
+    for (count, name), (cpu, wall) in bench(frames=frames).items():
+        print(f"{count:6d} {name:9s} {cpu:12.2f} {wall:13.2f} {1e3 / wall:7.0f}")
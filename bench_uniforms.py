@@ -0,0 +1,110 @@
+import os, sys, time
+os.environ.setdefault("QUANTIME_HEADLESS", "1")
+import numpy as np
+import shader_visualizer as sv
+from shader_visualizer import gl
+
+UPLOAD_CALLS = ((gl, "glUniform1f"), (gl, "glUniform2f"), (gl, "glBufferSubData"), (sv, "buffer_sub_data"))
+
+def count_calls(calls=UPLOAD_CALLS):
+    # Wraps the GL entry points the visualizer looks up on each call; returns
+    # the counts and the originals to put back.
+    counts = {name: 0 for _, name in calls}
+    originals = [(namespace, name, getattr(namespace, name)) for namespace, name in calls]
+    for namespace, name, original in originals:
+        def counted(*args, _name=name, _original=original):
+            counts[_name] += 1
+            return _original(*args)
+
+        setattr(namespace, name, counted)
+    return counts, originals
+
+def wide_shader(extra):
+    # The ridge shader plus `extra` float fields that all reach the output.
+    fields = "".join(f"    float extra{i};\n" for i in range(extra))
+    uniforms = "".join(f"uniform float extra{i};\n" for i in range(extra))
+    total = " + ".join(f"extra{i}" for i in range(extra)) or "0.0"
+    return f"""
+#ifdef QUANTIME_UBO
+layout(std140) uniform QuantimeState {{
+    vec2 resolution;
+    float entropy;
+    float coherence;
+    float time;
+{fields}}};
+#else
+uniform float entropy;
+uniform float coherence;
+uniform float time;
+uniform vec2 resolution;
+{uniforms}#endif
+
+void main() {{
+    vec2 pos = gl_FragCoord.xy / resolution.xy;
+    gl_FragColor = vec4(vec3(entropy, coherence, sin(time)) * (1.0 + {total}) * pos.x, 1.0);
+}}
+"""
+
+def bench_path(ubo, extra, frames):
+    fields = sv.STATE_FIELDS + tuple((f"extra{i}", 1) for i in range(extra))
+    program = sv.ShaderProgram(wide_shader(extra), header=sv.UBO_HEADER if ubo else sv.GLSL_HEADER)
+    program.use()
+    program.set_uniforms(resolution=(64, 64))
+    names = [f"extra{i}" for i in range(extra)]
+    values = np.random.default_rng(0).random((frames, extra), np.float32)
+    if ubo:
+        block = sv.UniformBlock(program.program, fields=fields)
+        block.values[0:2] = (64, 64)
+        slots = np.array([block.slots[name] for name in names], np.intp)
+
+        def upload(i):
+            block.values[block.slots["entropy"]] = 0.5
+            block.values[block.slots["coherence"]] = 0.25
+            block.values[block.slots["time"]] = i * 0.016
+            block.values[slots] = values[i]
+            block.upload()
+    else:
+        locations = [gl.glGetUniformLocation(program.program, name) for name in names]
+
+        def upload(i):
+            program.set_uniforms(0.5, 0.25, i * 0.016)
+            for location, value in zip(locations, values[i].tolist()):
+                gl.glUniform1f(location, value)
+
+    upload(0)
+    cpu, wall = time.process_time(), time.perf_counter()
+    for i in range(frames):
+        upload(i)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    # Counted separately so the wrappers do not inflate the timings.
+    counts, originals = count_calls()
+    for i in range(100):
+        upload(i)
+    for namespace, name, original in originals:
+        setattr(namespace, name, original)
+    gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+    gl.glFinish()
+    if ubo:
+        block.delete()
+    program.delete()
+    return sum(counts.values()) / 100, cpu / frames * 1e6, wall / frames * 1e6
+
+def bench(extras=(0, 8, 32), frames=20_000):
+    context = sv.HeadlessContext()
+    framebuffer = sv.Framebuffer(64, 64)
+    framebuffer.bind()
+    try:
+        results = {}
+        for extra in extras:
+            for ubo in (False, True):
+                results[extra, ubo] = bench_path(ubo, extra, frames)
+        return results
+    finally:
+        framebuffer.delete()
+        context.release()
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    print(f"{'fields':>6s} {'path':9s} {'calls/frame':>11s} {'cpu us/frame':>12s} {'wall us/frame':>13s}")
+    for (extra, ubo), (calls, cpu, wall) in bench(frames=frames).items():
+        print(f"{3 + extra:6d} {'ubo' if ubo else 'uniforms':9s} {calls:11.1f} {cpu:12.2f} {wall:13.2f}")
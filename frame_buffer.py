@@ -0,0 +1,142 @@
+import math, time
+from collections import deque
+
+# All buffers assume one producer (the network reader) and one consumer (the
+# render loop). Every mutation is a single attribute store or deque operation,
+# which the GIL makes atomic, so neither side ever takes a lock.
+
+class LatestSlot:
+    def __init__(self):
+        self._entry = (0, None)
+        self._read = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        self._entry = (self._entry[0] + 1, frame)
+
+    def take(self):
+        seq, frame = self._entry
+        if seq == self._read:
+            return None
+        self.dropped += seq - self._read - 1
+        self._read = seq
+        return frame
+
+    def peek(self):
+        return self._entry[1]
+
+    def __len__(self):
+        return int(self._entry[0] != self._read)
+
+POLICIES = ("latest", "drop-oldest", "drop-newest", "every-nth", "adaptive")
+
+class BoundedQueue:
+    # A frame arriving at a full queue evicts the oldest one (drop-oldest) or
+    # is discarded itself (drop-newest); either way it counts in `dropped`.
+    def __init__(self, maxlen=64, policy="drop-oldest"):
+        if policy not in ("drop-oldest", "drop-newest"):
+            raise ValueError(f"unknown queue policy {policy!r}")
+        self._frames = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        self.keep_oldest = policy == "drop-newest"
+        self.dropped = 0
+
+    def put(self, frame):
+        if len(self._frames) == self.maxlen:
+            self.dropped += 1
+            if self.keep_oldest:
+                return
+        self._frames.append(frame)
+
+    def take(self):
+        try:
+            return self._frames.popleft()
+        except IndexError:
+            return None
+
+    def peek(self):
+        return self._frames[-1] if self._frames else None
+
+    def __len__(self):
+        return len(self._frames)
+
+class Decimator:
+    # Forwards every `every`-th frame to `buffer` and sheds the rest, counted
+    # in `decimated` (`dropped` also includes what the buffer itself drops).
+    def __init__(self, buffer, every=2):
+        self.buffer = buffer
+        self.every = every
+        self.arrived = 0
+        self.taken = 0
+        self.decimated = 0
+
+    def put(self, frame):
+        self.arrived += 1
+        if self.arrived % self.every:
+            self.decimated += 1
+            return
+        self.buffer.put(frame)
+
+    def take(self):
+        frame = self.buffer.take()
+        if frame is not None:
+            self.taken += 1
+        return frame
+
+    def peek(self):
+        return self.buffer.peek()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    @property
+    def dropped(self):
+        return self.decimated + self.buffer.dropped
+
+class AdaptiveDecimator(Decimator):
+    # Every `window` seconds compares the arrival rate with the rate the
+    # consumer has been taking frames. While the queue is over `high` full,
+    # `every` rises to arrivals / takes (plus `headroom`), so what gets
+    # through matches what the consumer can handle; once the queue is below
+    # `low` full, `every` decays back towards 1. The producer does the
+    # bookkeeping; the consumer only bumps `taken`.
+    def __init__(self, buffer, window=0.5, high=0.5, low=0.1, headroom=1.25, max_every=4096):
+        super().__init__(buffer, 1)
+        self.window = window
+        self.high = high
+        self.low = low
+        self.headroom = headroom
+        self.max_every = max_every
+        self.capacity = getattr(buffer, "maxlen", 1)
+        self._mark = (time.monotonic(), 0, 0)
+
+    def put(self, frame):
+        super().put(frame)
+        if not self.arrived % 64 and time.monotonic() - self._mark[0] >= self.window:
+            self._adapt()
+
+    def _adapt(self):
+        now, arrived, taken = time.monotonic(), self.arrived, self.taken
+        since, arrived_before, taken_before = self._mark
+        self._mark = (now, arrived, taken)
+        depth = len(self.buffer) / self.capacity
+        if depth > self.high:
+            takes = taken - taken_before
+            wanted = (math.ceil(self.headroom * (arrived - arrived_before) / takes) if takes
+                      else 2 * self.every)
+            self.every = min(max(self.every, wanted), self.max_every)
+        elif depth < self.low and self.every > 1:
+            self.every = max(1, int(self.every * 0.75))
+
+def make_buffer(policy="latest", maxlen=64, every=2):
+    # Buffers for the POLICIES names; "latest" is the LatestSlot the renderer
+    # uses by default.
+    if policy == "latest":
+        return LatestSlot()
+    if policy in ("drop-oldest", "drop-newest"):
+        return BoundedQueue(maxlen, policy)
+    if policy == "every-nth":
+        return Decimator(BoundedQueue(maxlen), every)
+    if policy == "adaptive":
+        return AdaptiveDecimator(BoundedQueue(maxlen))
+    raise ValueError(f"unknown buffer policy {policy!r}")
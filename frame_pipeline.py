@@ -0,0 +1,176 @@
+import heapq, itertools, os, pickle, signal, struct, sys, threading, time
+import multiprocessing as mp
+from collections import deque
+from shm_ring import ByteRing
+
+HEADER = struct.Struct("<QB")
+
+def decode_frame(message):
+    from stream_bridge import decode_auto
+    return decode_auto(message)
+
+def _worker(inbox, outbox, items, ready, stop, process):
+    # Ctrl-C goes to the whole process group; the parent shuts workers down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while not stop.is_set():
+        if not items.acquire(timeout=0.1):
+            continue
+        message = inbox.get()
+        seq, raw = message[:8], message[HEADER.size:]
+        try:
+            result = pickle.dumps(process(raw.decode() if message[8] else raw), pickle.HIGHEST_PROTOCOL)
+            if len(result) > outbox.slot_size - 8:
+                raise ValueError(f"result of {len(result)} bytes exceeds the result slot")
+        except Exception:
+            # Empty result: the collector counts an error and moves on.
+            result = b""
+        while not outbox.put(seq + result):
+            if stop.is_set():
+                return
+            time.sleep(0.0005)
+        ready.release()
+
+class FramePipeline:
+    # Spreads CPU-heavy per-frame work (decode, analytics) over worker
+    # processes. submit() copies the raw frame into the next worker's
+    # shared-memory ring (round robin, falling back to any ring with room);
+    # a collector thread gathers results from the per-worker result rings and
+    # re-orders them by submission sequence before calling `deliver`. When
+    # every ring is full the frame is shed rather than blocking the reader,
+    # as is a frame larger than `slot_size` (also counted in `oversize`).
+    # Results over `result_size` count as errors. If a worker dies, the
+    # collector skips the frames it still held and stops feeding it. An
+    # exception from `deliver` stops the collector and is re-raised by the
+    # next submit(), ending the stream as it would without workers.
+    # `process` must be a picklable top-level function of the raw message.
+    def __init__(self, deliver, process=decode_frame, workers=None, slots=4096, slot_size=1024,
+                 result_size=1024, context=None):
+        context = context or mp.get_context()
+        self.deliver = deliver
+        self.workers = workers or os.cpu_count() or 1
+        self.inboxes = [ByteRing(slots, HEADER.size + slot_size) for _ in range(self.workers)]
+        self.outboxes = [ByteRing(slots, 8 + result_size) for _ in range(self.workers)]
+        self.items = [context.Semaphore(0) for _ in range(self.workers)]
+        self.ready = context.Semaphore(0)
+        self.stop = context.Event()
+        self.processes = [context.Process(target=_worker, daemon=True, name=f"frame-worker-{i}",
+                                          args=(self.inboxes[i], self.outboxes[i], self.items[i],
+                                                self.ready, self.stop, process))
+                          for i in range(self.workers)]
+        self.submitted = 0
+        self.delivered = 0
+        self.shed = 0
+        self.oversize = 0
+        self.errors = 0
+        self.slot_size = slot_size
+        self.alive = [True] * self.workers
+        self.error = None
+        # Seqs each worker has been given and not yet returned, in order.
+        self.inflight = [deque() for _ in range(self.workers)]
+        self._seq = itertools.count()
+        self._skipped = set()
+        # Held by submit() from the liveness check to recording the seq, and
+        # by _reap() while it retires a worker, so no seq lands on a worker
+        # after its inflight frames have been skipped.
+        self._lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name="frame-collector", daemon=True)
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        self._collector.start()
+        return self
+
+    def submit(self, message):
+        if self.error is not None:
+            raise self.error
+        seq = next(self._seq)
+        text = isinstance(message, str)
+        data = message.encode() if text else message
+        if len(data) > self.slot_size:
+            self.oversize += 1
+        else:
+            payload = HEADER.pack(seq, text) + data
+            first = seq % self.workers
+            with self._lock:
+                for i in itertools.chain(range(first, self.workers), range(first)):
+                    if self.alive[i] and self.inboxes[i].put(payload):
+                        self.inflight[i].append(seq)
+                        self.items[i].release()
+                        self.submitted += 1
+                        return True
+        self._skipped.add(seq)
+        self.shed += 1
+        return False
+
+    put = __call__ = submit
+
+    def _receive(self, heap, i):
+        message = self.outboxes[i].get()
+        if message is None:
+            return False
+        self.inflight[i].popleft()
+        heapq.heappush(heap, (int.from_bytes(message[:8], "little"), message[8:]))
+        return True
+
+    def _reap(self, heap):
+        # A dead worker will never return what it still holds: keep what it
+        # finished and skip the rest, or the collector waits forever.
+        for i, process in enumerate(self.processes):
+            if self.alive[i] and not process.is_alive() and not self.stop.is_set():
+                with self._lock:
+                    self.alive[i] = False
+                    while self._receive(heap, i):
+                        pass
+                    lost = self.inflight[i]
+                    while lost:
+                        self._skipped.add(lost.popleft())
+                        self.errors += 1
+                print(f"frame worker {i} exited with code {process.exitcode}", file=sys.stderr, flush=True)
+
+    def _collect(self):
+        heap, expected = [], 0
+        start = 0
+        next_reap = time.monotonic()
+        while not self.stop.is_set():
+            if self.ready.acquire(timeout=0.05):
+                for i in itertools.chain(range(start, self.workers), range(start)):
+                    if self._receive(heap, i):
+                        start = (i + 1) % self.workers
+                        break
+            if time.monotonic() >= next_reap:
+                next_reap = time.monotonic() + 0.1
+                self._reap(heap)
+            while True:
+                if expected in self._skipped:
+                    self._skipped.discard(expected)
+                elif heap and heap[0][0] == expected:
+                    result = heapq.heappop(heap)[1]
+                    if result:
+                        self.delivered += 1
+                        try:
+                            self.deliver(pickle.loads(result))
+                        except Exception as exc:
+                            self.error = exc
+                            return
+                    else:
+                        self.errors += 1
+                else:
+                    break
+                expected += 1
+
+    def close(self):
+        self.stop.set()
+        self._collector.join()
+        for process in self.processes:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+        for ring in self.inboxes + self.outboxes:
+            ring.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
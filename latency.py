@@ -0,0 +1,147 @@
+import math
+from time import perf_counter_ns
+import numpy as np
+
+STAGES = ("receive", "decode", "enqueue", "upload", "swap")
+
+class LatencyHistogram:
+    # HdrHistogram-style log-linear buckets over integer nanoseconds: values
+    # below 2**sub_bits get a bucket each, and every further power of two is
+    # split into 2**(sub_bits - 1) linear buckets, so a reported quantile is
+    # within 2**-(sub_bits - 1) of the true value (0.8% at the default) from
+    # nanoseconds to `max_seconds`. record() is a few integer ops and a list
+    # increment.
+    def __init__(self, sub_bits=8, max_seconds=60.0):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.counts = [0] * self._index(int(max_seconds * 1e9) + 1)
+        self.last = len(self.counts) - 1
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        shift = max(value.bit_length() - self.sub_bits, 0)
+        return shift * self.half + (value >> shift)
+
+    def _lower(self, index):
+        if index < 2 * self.half:
+            return index
+        shift = index // self.half - 1
+        return (index - shift * self.half) << shift
+
+    def record(self, value):
+        shift = value.bit_length() - self.sub_bits
+        index = shift * self.half + (value >> shift) if shift > 0 else value
+        self.counts[index if index < self.last else self.last] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q, counts=None):
+        cumulative = np.cumsum(self.counts if counts is None else counts)
+        if not cumulative[-1]:
+            return math.nan
+        index = min(int(np.searchsorted(cumulative, q * cumulative[-1], side="left")), self.last)
+        # Bucket midpoint, capped at the largest value seen.
+        return min((self._lower(index) + self._lower(index + 1) - 1) / 2, self.max)
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.max = 0
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99, 0.999)):
+        # Milliseconds.
+        counts = list(self.counts)
+        count = sum(counts)
+        stats = {"count": count, "mean_ms": self.total / count / 1e6 if count else math.nan}
+        for q in quantiles:
+            stats[f"p{q * 100:g}_ms"] = self.quantile(q, counts) / 1e6
+        stats["max_ms"] = self.max / 1e6
+        return stats
+
+class LatencyTracer:
+    # Stamps every `sample`-th frame along the stream-to-pixel path with
+    # perf_counter_ns: receive and decode in QuantimeStream, enqueue in
+    # run_quantime_stream, uniform upload and buffer swap in the RenderLoop.
+    # Each hop (ending at decode, enqueue, upload, swap) and the end-to-end
+    # time from the first stamp to the swap get a LatencyHistogram. Hops a
+    # source has no stamp for (a replay has no socket receive) are skipped,
+    # and only frames the renderer actually draws reach upload/swap; frames
+    # coalesced away in the buffer end at enqueue. Setting `enabled` to
+    # False stops stamping; the remaining cost is an attribute check per call.
+    def __init__(self, sample=1, sub_bits=8):
+        self.sample = max(int(sample), 1)
+        self.enabled = True
+        self.histograms = {stage: LatencyHistogram(sub_bits) for stage in (*STAGES[1:], "total")}
+        self._decode = self.histograms["decode"]
+        self._enqueue = self.histograms["enqueue"]
+        self._count = 0
+        self._sourced = False
+        self._reading = None
+        self._pending = None
+        self._drawing = None
+
+    def received(self):
+        self._sourced = True
+        self._count += 1
+        if self.enabled and not self._count % self.sample:
+            self._reading = [perf_counter_ns(), None, None, None, None]
+        else:
+            self._reading = None
+
+    def decoded(self):
+        if self._reading is not None:
+            self._reading[1] = perf_counter_ns()
+
+    def enqueued(self, frame):
+        stamps = self._reading
+        if stamps is None:
+            if self._sourced:
+                return
+            self._count += 1
+            if not self.enabled or self._count % self.sample:
+                return
+            stamps = [None] * len(STAGES)
+        else:
+            self._reading = None
+        stamps[2] = now = perf_counter_ns()
+        if stamps[1] is not None:
+            self._decode.record(stamps[1] - stamps[0])
+            self._enqueue.record(now - stamps[1])
+        self._pending = (frame, frame.get("seq") if isinstance(frame, dict) else None, stamps)
+
+    def taken(self, frame):
+        # Render thread: called with what source.take() returned.
+        pending = self._pending
+        if pending is None or frame is None:
+            return
+        expected, seq, stamps = pending
+        if frame is expected or (seq is not None and frame["seq"] == seq):
+            self._pending = None
+            self._drawing = stamps
+
+    def uploaded(self):
+        if self._drawing is not None:
+            self._drawing[3] = perf_counter_ns()
+
+    def swapped(self):
+        stamps, self._drawing = self._drawing, None
+        if stamps is None:
+            return
+        stamps[4] = now = perf_counter_ns()
+        histograms = self.histograms
+        histograms["upload"].record(stamps[3] - stamps[2])
+        histograms["swap"].record(now - stamps[3])
+        histograms["total"].record(now - (stamps[0] if stamps[0] is not None else stamps[2]))
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
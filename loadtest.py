@@ -0,0 +1,114 @@
+import argparse, asyncio, os, subprocess, sys, time
+# No windows here; --handler visualizer renders offscreen.
+os.environ.setdefault("QUANTIME_HEADLESS", "1")
+from frame_buffer import BoundedQueue, LatestSlot
+from stream_bridge import QuantimeStream, run_quantime_stream
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quantime_simulator.py")
+
+def make_handler(name):
+    # Returns the handler and a function releasing what it set up.
+    if name == "null":
+        return (lambda data: None), (lambda: None)
+    if name.startswith("sleep:"):
+        delay = float(name.split(":", 1)[1]) / 1000
+        return (lambda data: time.sleep(delay)), (lambda: None)
+    if name == "visualizer":
+        # update_visualizer needs a module visualizer, which needs a context.
+        import shader_visualizer
+        renderer = shader_visualizer.OffscreenRenderer(64, 64)
+        shader_visualizer.visualizer = renderer.visualizer
+
+        def close():
+            shader_visualizer.visualizer = None
+            renderer.close()
+
+        return shader_visualizer.update_visualizer, close
+    raise ValueError(f"unknown handler {name!r}")
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+async def measure(url, duration, handler, buffer, decoder="auto"):
+    stream = QuantimeStream(url, decoder=decoder)
+    latencies = []
+    received = 0
+    first = end = None
+
+    async def counted():
+        nonlocal received, first
+        async for data in stream:
+            if first is None:
+                first = time.perf_counter()
+            received += 1
+            yield data
+
+    def timed(data):
+        handler(data)
+        latencies.append(time.time() - data["timestamp"])
+
+    async def timed_run():
+        # The window starts at the first frame so simulator start-up and the
+        # initial reconnect backoff are not counted against throughput, and
+        # ends before the cancel so closing a loaded connection is not either.
+        nonlocal end
+        task = asyncio.ensure_future(run_quantime_stream(counted(), timed, buffer))
+        while first is None and not task.done():
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(duration)
+        end = (time.perf_counter(), received)
+        task.cancel()
+        results = await asyncio.gather(task, return_exceptions=True)
+        if isinstance(results[0], Exception):
+            raise results[0]
+
+    await timed_run()
+    elapsed = end[0] - first if first is not None else 0.0
+    latencies.sort()
+    return {
+        "received": end[1],
+        "handled": len(latencies),
+        "rate": end[1] / elapsed if elapsed else 0.0,
+        "gaps": stream.gaps,
+        "shed": buffer.dropped,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else float("nan")) * 1000,
+    }
+
+def run(rate, args):
+    simulator = subprocess.Popen([sys.executable, SIMULATOR, "--port", str(args.port), "--rate", str(rate),
+                                  "--format", args.format, "--payload-size", str(args.payload_size),
+                                  "--burst-size", str(args.burst_size), "--burst-every", str(args.burst_every)],
+                                 stdout=subprocess.DEVNULL)
+    handler, close = make_handler(args.handler)
+    try:
+        buffer = BoundedQueue(args.queue) if args.queue else LatestSlot()
+        return asyncio.run(measure(f"ws://127.0.0.1:{args.port}", args.duration, handler, buffer))
+    finally:
+        close()
+        simulator.terminate()
+        simulator.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive stream_bridge from the local simulator and report latency/drops.")
+    parser.add_argument("--rates", default="1000,10000,100000", help="comma-separated offered rates (frames/s)")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per rate")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--format", choices=("json", "msgpack", "binary"), default="json")
+    parser.add_argument("--payload-size", type=int, default=0)
+    parser.add_argument("--burst-size", type=int, default=0)
+    parser.add_argument("--burst-every", type=float, default=0.0)
+    parser.add_argument("--queue", type=int, default=0, help="bounded queue depth instead of the latest-value slot")
+    parser.add_argument("--handler", default="null", help="null, sleep:<ms> or visualizer")
+    args = parser.parse_args(argv)
+    print(f"{'offered':>9} {'received/s':>11} {'handled':>8} {'gaps':>6} {'shed':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        r = run(rate, args)
+        print(f"{rate:9.0f} {r['rate']:11.0f} {r['handled']:8d} {r['gaps']:6d} {r['shed']:8d} "
+              f"{r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['max_ms']:8.2f}", flush=True)
+
+if __name__ == "__main__":
+    main()
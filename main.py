@@ -1,4 +1,108 @@
-from stream_bridge import start_quantime_stream
+import argparse, json, os
+from frame_buffer import POLICIES, make_buffer
 
 if __name__ == "__main__":
-    start_quantime_stream()
+    parser = argparse.ArgumentParser(description="Stream quantime frames into the awareness ridge visualizer.")
+    parser.add_argument("--url", help="quantime stream endpoint (default: the civilisation.one stream)")
+    parser.add_argument("--token", help="observer node token")
+    parser.add_argument("--fps", type=float, default=60.0)
+    parser.add_argument("--headless", action="store_true", help="render offscreen through EGL even if a display is available")
+    parser.add_argument("--export-dir", help="write a PNG of the ridge here every --export-interval seconds")
+    parser.add_argument("--export-interval", type=float, default=1.0)
+    parser.add_argument("--record", help="append every received frame to this recording (.qtm)")
+    parser.add_argument("--fsync", choices=("none", "batch", "interval"), default="interval")
+    parser.add_argument("--sources", help='JSON file listing observer nodes: [{"url": ..., "token": ..., "source": ...}, ...]')
+    parser.add_argument("--replay", help="play a recording back instead of connecting to the live stream")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--start", type=float, help="replay from this unix timestamp")
+    parser.add_argument("--workers", type=int, default=0, help="decode and analyse frames in N worker processes (live stream only)")
+    parser.add_argument("--buffer", choices=POLICIES, default="latest",
+                        help="how frames queue for the renderer when it falls behind (default: keep only the newest)")
+    parser.add_argument("--queue-size", type=int, default=64, help="queue length for the queueing --buffer policies")
+    parser.add_argument("--every", type=int, default=2, help="keep 1 in N frames with --buffer every-nth")
+    parser.add_argument("--ring", type=int, default=0, metavar="SLOTS",
+                        help="hand frames to the renderer through a shared-memory ring of SLOTS records")
+    parser.add_argument("--detect", action="store_true", help="print coherence-collapse / entropy-spike events")
+    parser.add_argument("--stats", action="store_true",
+                        help="print rolling entropy/coherence statistics every --report-interval seconds (default 1)")
+    parser.add_argument("--latency", type=int, default=0, metavar="N",
+                        help="trace every Nth frame from socket to buffer swap (reported with --report-interval)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--history", type=int, default=0, metavar="N",
+                        help="draw the last N samples of each source as a scrolling waterfall")
+    parser.add_argument("--tiles", action="store_true",
+                        help="draw one ridge tile per source (with --sources) in a single instanced call")
+    parser.add_argument("--shader-cache", metavar="DIR",
+                        help="cache linked shader binaries here (default: ~/.cache/quantime/shaders)")
+    parser.add_argument("--no-shader-cache", action="store_true", help="always compile the shader")
+    parser.add_argument("--watch-shader", action="store_true",
+                        help="recompile ridge_shader.glsl when it changes, without restarting the stream")
+    parser.add_argument("--report-interval", type=float, default=0.0, help="print render statistics every N seconds")
+    args = parser.parse_args()
+    if args.history and args.tiles:
+        parser.error("--history and --tiles are separate display modes")
+    if args.workers and (args.replay or args.sources):
+        parser.error("--workers applies to the single live stream only")
+    if args.headless:
+        os.environ["QUANTIME_HEADLESS"] = "1"
+
+    from stream_bridge import start_quantime_stream
+
+    tracer = None
+    if args.latency:
+        from latency import LatencyTracer
+        tracer = LatencyTracer(args.latency)
+    sinks = []
+    if args.detect:
+        from anomaly_detector import AnomalyDetector, format_event
+        sinks.append(AnomalyDetector(on_event=lambda event: print(format_event(event), flush=True)))
+    if args.stats:
+        from rolling_stats import SourceStats, format_summary
+        sinks.append(SourceStats(report_interval=args.report_interval or 1.0,
+                                 on_report=lambda source, summary: print(format_summary(summary, source), flush=True)))
+    stream = None
+    if args.replay:
+        from quantime_replay import ReplaySource
+        stream = ReplaySource(args.replay, speed=args.speed, start=args.start)
+    elif args.sources:
+        from stream_bridge import fan_in
+        with open(args.sources) as f:
+            stream = fan_in(json.load(f))
+    elif args.url or args.token:
+        from stream_bridge import AUTH_TOKEN, STREAM_URL, QuantimeStream
+        stream = QuantimeStream(args.url or STREAM_URL, args.token or AUTH_TOKEN,
+                                decoder="raw" if args.workers else "auto", tracer=tracer)
+    history = tiles = None
+    streams = len(stream.streams) if hasattr(stream, "streams") else 1
+    if args.history:
+        from shader_visualizer import History
+        history = History(args.history, streams)
+    if args.tiles:
+        from shader_visualizer import StreamStates
+        tiles = StreamStates(streams)
+    from shader_visualizer import ShaderManager, default_cache_dir
+    shaders = ShaderManager(None if args.no_shader_cache else args.shader_cache or default_cache_dir(),
+                            watch=args.watch_shader)
+    metrics = server = None
+    if args.metrics_port:
+        from metrics import MetricsServer, Registry
+        metrics = Registry()
+        server = MetricsServer(metrics, args.metrics_port).start()
+    ring = None
+    if args.ring:
+        from shm_ring import RecordRing
+        ring = RecordRing(args.ring)
+        print("ring", ring.name, flush=True)
+    try:
+        start_quantime_stream(stream, fps=args.fps, report_interval=args.report_interval,
+                              export_dir=args.export_dir, export_interval=args.export_interval,
+                              record=args.record, fsync=args.fsync, sinks=sinks, workers=args.workers, ring=ring,
+                              tracer=tracer, metrics=metrics,
+                              buffer=make_buffer(args.buffer, args.queue_size, args.every), history=history,
+                              tiles=tiles, shaders=shaders)
+    finally:
+        if ring:
+            ring.close()
+        if server:
+            server.close()
@@ -0,0 +1,199 @@
+import math, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import shader_visualizer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Counter:
+    # Plain attribute increments: safe under the GIL as long as each counter
+    # has a single writer, which is how the hot path uses them.
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    if value in (math.inf, -math.inf):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+class Registry:
+    # Metric families in the Prometheus text format. Most are callbacks that
+    # read counters the stream objects keep anyway, so the hot path pays
+    # nothing extra and nothing at all when no registry exists. A callback
+    # returns a number or a list of (labels dict, number[, name suffix])
+    # samples.
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, kind, help, collect):
+        with self.lock:
+            self.families[name] = (kind, help, collect)
+
+    def counter(self, name, help, collect=None):
+        metric = Counter()
+        self.register(name, "counter", help, collect or (lambda: metric.value))
+        return metric
+
+    def gauge(self, name, help, collect=None):
+        metric = Gauge()
+        self.register(name, "gauge", help, collect or (lambda: metric.value))
+        return metric
+
+    def collect(self):
+        with self.lock:
+            families = list(self.families.items())
+        for name, (kind, help, collect) in families:
+            try:
+                samples = collect()
+            except Exception:
+                continue
+            if not isinstance(samples, list):
+                samples = [({}, samples)]
+            yield name, kind, help, samples
+
+    def expose(self):
+        lines = []
+        for name, kind, help, samples in self.collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value, *suffix in samples:
+                lines.append(f"{name}{''.join(suffix)}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+def _per_source(streams, attribute):
+    return lambda: [({"source": str(getattr(stream, "source", i))}, getattr(stream, attribute))
+                    for i, stream in enumerate(streams) if hasattr(stream, attribute)]
+
+def _latency(tracer):
+    def collect():
+        samples = []
+        for hop, histogram in tracer.histograms.items():
+            counts = list(histogram.counts)
+            for q in (0.5, 0.9, 0.99, 0.999):
+                samples.append(({"hop": hop, "quantile": str(q)}, histogram.quantile(q, counts) / 1e9))
+            samples.append(({"hop": hop}, histogram.total / 1e9, "_sum"))
+            samples.append(({"hop": hop}, sum(counts), "_count"))
+        return samples
+    return collect
+
+def instrument(registry, stream=None, buffer=None, render=None, pipeline=None, recorder=None, ring=None,
+               tracer=None):
+    # Registers what each given object already counts. `stream` may be a
+    # QuantimeStream or a FanIn (one sample per source); objects without a
+    # given counter (e.g. a ReplaySource) are skipped.
+    if stream is not None:
+        streams = getattr(stream, "streams", [stream])
+        for name, attribute, help in (
+                ("quantime_messages_total", "messages", "Messages received from the stream"),
+                ("quantime_bytes_total", "bytes", "Payload bytes (characters for text frames) received"),
+                ("quantime_decode_errors_total", "decode_errors", "Messages that failed to decode and were skipped"),
+                ("quantime_reconnects_total", "reconnects", "Reconnects after a dropped connection"),
+                ("quantime_seq_gaps_total", "gaps", "Frames missing from the seq sequence"),
+                ("quantime_seq_duplicates_total", "duplicates", "Frames dropped as already seen (seq replayed)"),
+                ("quantime_seq_resets_total", "resets", "Reconnects where the endpoint restarted its seq")):
+            registry.register(name, "counter", help, _per_source(streams, attribute))
+        if hasattr(stream, "late"):
+            registry.register("quantime_late_frames_total", "counter",
+                              "Fan-in frames released after a newer one", lambda: stream.late)
+    if buffer is not None:
+        registry.register("quantime_queue_depth", "gauge", "Frames waiting for the renderer", lambda: len(buffer))
+        registry.register("quantime_dropped_frames_total", "counter",
+                          "Frames replaced in the buffer before the renderer took them", lambda: buffer.dropped)
+    if hasattr(buffer, "decimated"):
+        registry.register("quantime_decimated_frames_total", "counter",
+                          "Frames shed by decimation before the buffer", lambda: buffer.decimated)
+        registry.register("quantime_decimation", "gauge", "Current decimation factor (1 in N frames kept)",
+                          lambda: buffer.every)
+    if ring is not None:
+        registry.register("quantime_ring_shed_frames_total", "counter",
+                          "Frames the shared-memory ring refused while full", lambda: ring.shed)
+    if pipeline is not None:
+        registry.register("quantime_pipeline_queue_depth", "gauge", "Raw frames waiting for a decode worker",
+                          lambda: sum(len(inbox) for inbox in pipeline.inboxes))
+        registry.register("quantime_pipeline_shed_frames_total", "counter",
+                          "Frames shed because every worker ring was full", lambda: pipeline.shed)
+        registry.register("quantime_pipeline_oversize_frames_total", "counter",
+                          "Frames shed because they exceed the worker ring slot", lambda: pipeline.oversize)
+        registry.register("quantime_pipeline_errors_total", "counter",
+                          "Frames a decode worker failed on", lambda: pipeline.errors)
+    if recorder is not None:
+        registry.register("quantime_recorded_frames_total", "counter", "Frames written to the recording",
+                          lambda: recorder.written)
+        registry.register("quantime_recorder_skipped_total", "counter",
+                          "Frames the recorder skipped for missing or non-numeric fields", lambda: recorder.skipped)
+        registry.register("quantime_recorder_write_errors_total", "counter",
+                          "Recording batches dropped because the write failed", lambda: recorder.write_errors)
+    if render is not None:
+        stats = render.stats
+        registry.register("quantime_render_frames_total", "counter", "Frames rendered", lambda: stats.frames)
+        registry.register("quantime_render_late_total", "counter",
+                          "Times the render loop fell more than a frame behind", lambda: stats.late)
+        registry.register("quantime_render_fps", "gauge", "Render rate over the recent window",
+                          lambda: stats.summary().get("fps", 0.0))
+        registry.register("quantime_captured_frames_total", "counter", "Frames read back for export",
+                          lambda: render.capture.captured if render.capture else 0)
+        registry.register("quantime_capture_skipped_total", "counter",
+                          "Exports skipped because every readback buffer was still in flight",
+                          lambda: render.capture.skipped if render.capture else 0)
+        registry.register("quantime_render_frame_seconds", "gauge", "Render work per frame over the recent window",
+                          lambda: [({"stat": stat}, summary[f"{stat}_ms"] / 1e3)
+                                   for summary in [stats.summary()] if summary["frames"]
+                                   for stat in ("mean", "p95", "max")])
+    registry.register("quantime_visualizer_updates_total", "counter", "Stream states applied to the visualizer",
+                      lambda: shader_visualizer.visualizer.updates if shader_visualizer.visualizer else 0)
+    if tracer is not None:
+        registry.register("quantime_latency_seconds", "summary", "Per-hop and end-to-end frame latency",
+                          _latency(tracer))
+    return registry
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.expose().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer(ThreadingHTTPServer):
+    # Scrape endpoint on its own daemon thread; binds to localhost unless
+    # told otherwise.
+    daemon_threads = True
+
+    def __init__(self, registry, port=9108, host="127.0.0.1"):
+        super().__init__((host, port), _Handler)
+        self.registry = registry
+        self.thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
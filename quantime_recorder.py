@@ -0,0 +1,129 @@
+import math, os, struct, sys, threading, time
+from collections import deque
+import numpy as np
+
+# File layout: a 16-byte header followed by fixed-width little-endian records,
+# so a recording can be memory-mapped straight into RECORD_DTYPE.
+MAGIC = b"QTMREC\x00\x01"
+VERSION = 1
+EXTRAS = 4
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct(f"<dQff{EXTRAS}f")
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("seq", "<u8"), ("entropy", "<f4"),
+                         ("coherence", "<f4"), ("extras", "<f4", (EXTRAS,))])
+FSYNC_POLICIES = ("none", "batch", "interval")
+
+NO_EXTRAS = (math.nan,) * EXTRAS
+
+class Recorder:
+    # append() is safe to call from the socket thread: it only pushes the frame
+    # onto a deque. A writer thread packs whatever has accumulated into one
+    # buffer and issues a single write per batch (group commit), then applies
+    # the fsync policy: never, after every batch, or every fsync_interval s.
+    # Frames that cannot be packed (no entropy/coherence, non-numeric values)
+    # are counted in `skipped`; a failed write drops its batch and is counted
+    # in `write_errors`, and the writer carries on with the next batch.
+    def __init__(self, path, batch=8192, flush_interval=0.05, fsync="interval", fsync_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.skipped = 0
+        self.write_errors = 0
+        self._pending = deque()
+        self._seq = 0
+        self._wake = threading.Event()
+        self._closing = False
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, EXTRAS, 0))
+            self._file.flush()
+        elif self._file.tell() < HEADER.size or (self._file.tell() - HEADER.size) % RECORD.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a complete quantime recording")
+        self._thread = threading.Thread(target=self._run, name="quantime-recorder", daemon=True)
+        self._thread.start()
+
+    def append(self, frame):
+        self._pending.append((time.time(), frame))
+        if len(self._pending) >= self.batch:
+            self._wake.set()
+
+    __call__ = append
+
+    def _pack(self, count):
+        buffer = bytearray(count * RECORD.size)
+        pop, pack_into, size = self._pending.popleft, RECORD.pack_into, RECORD.size
+        offset = 0
+        for _ in range(count):
+            received, frame = pop()
+            try:
+                seq = frame.get("seq")
+                if seq is None:
+                    seq = self._seq
+                extras = frame.get("extras") or NO_EXTRAS
+                if len(extras) != EXTRAS:
+                    extras = (tuple(extras) + NO_EXTRAS)[:EXTRAS]
+                pack_into(buffer, offset, frame.get("timestamp", received), seq,
+                          frame["entropy"], frame["coherence"], *extras)
+            except (AttributeError, KeyError, TypeError, ValueError, struct.error):
+                self.skipped += 1
+                continue
+            self._seq = seq + 1
+            offset += size
+        return memoryview(buffer)[:offset]
+
+    def _run(self):
+        last_sync = time.monotonic()
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            closing = self._closing
+            count = len(self._pending)
+            if count:
+                try:
+                    buffer = self._pack(count)
+                    self._file.write(buffer)
+                    self._file.flush()
+                    self.written += len(buffer) // RECORD.size
+                    now = time.monotonic()
+                    if self.fsync == "batch" or (self.fsync == "interval" and now - last_sync >= self.fsync_interval):
+                        os.fsync(self._file.fileno())
+                        last_sync = now
+                except Exception as exc:
+                    self.write_errors += 1
+                    print(f"recorder: dropped a batch of {count} frames: {exc!r}", file=sys.stderr, flush=True)
+            if closing and not self._pending:
+                return
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        if self.fsync != "none":
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_recording(path):
+    # Memory-mapped, read-only view of every complete record; a torn record
+    # at the end (crash mid-write) is ignored.
+    with open(path, "rb") as f:
+        magic, version, extras, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or extras != EXTRAS:
+        raise ValueError(f"{path} is not a version {VERSION} quantime recording")
+    count = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+    if not count:
+        return np.empty(0, RECORD_DTYPE)
+    return np.memmap(path, RECORD_DTYPE, "r", offset=HEADER.size, shape=(count,))
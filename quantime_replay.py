@@ -0,0 +1,53 @@
+import asyncio, bisect, math, time
+from quantime_recorder import read_recording
+
+class ReplaySource:
+    # Drop-in replacement for QuantimeStream that plays a Recorder log back:
+    # at recorded pace scaled by `speed`, or as fast as possible when speed is
+    # 0/None/inf. Seeking uses a sparse index of every `index_stride`-th
+    # timestamp, so it touches a handful of pages of the mapping, not the
+    # whole file. Assumes timestamps are non-decreasing, as recorded live.
+    def __init__(self, path, speed=1.0, start=None, end=None, index_stride=4096, block=1024):
+        self.path = path
+        self.records = read_recording(path)
+        self.speed = speed if speed and math.isfinite(speed) else None
+        self.start = start
+        self.end = end
+        self.index_stride = index_stride
+        self.block = block
+        self.index = self.records["timestamp"][::index_stride].tolist()
+        self.position = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def seek(self, timestamp):
+        # Position of the first record at or after `timestamp`.
+        chunk = max(bisect.bisect_left(self.index, timestamp) - 1, 0)
+        lo = chunk * self.index_stride
+        hi = min(lo + 2 * self.index_stride, len(self.records))
+        timestamps = self.records["timestamp"][lo:hi].tolist()
+        return lo + bisect.bisect_left(timestamps, timestamp)
+
+    async def __aiter__(self):
+        records = self.records
+        first = 0 if self.start is None else self.seek(self.start)
+        last = len(records) if self.end is None else self.seek(self.end)
+        if first >= last:
+            return
+        origin = float(records["timestamp"][first])
+        started = time.perf_counter()
+        for lo in range(first, last, self.block):
+            block = records[lo:min(lo + self.block, last)]
+            columns = zip(block["timestamp"].tolist(), block["seq"].tolist(),
+                          block["entropy"].tolist(), block["coherence"].tolist())
+            for offset, (timestamp, seq, entropy, coherence) in enumerate(columns):
+                if self.speed is not None:
+                    delay = (timestamp - origin) / self.speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                self.position = lo + offset
+                yield {"timestamp": timestamp, "seq": seq, "entropy": entropy, "coherence": coherence}
+            if self.speed is None:
+                # Let the consumer and other tasks run between blocks.
+                await asyncio.sleep(0)
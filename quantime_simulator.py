@@ -0,0 +1,118 @@
+import argparse, asyncio, json, math, random, time
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+from stream_bridge import encode_binary, msgpack
+
+class QuantimeSimulator:
+    def __init__(self, host="127.0.0.1", port=8765, rate=1000.0, fmt="json", payload_size=0,
+                 burst_size=0, burst_every=0.0, collapse_every=0.0, close_after=0, seed=None):
+        if fmt == "msgpack" and not msgpack:
+            raise ValueError("msgpack format requires the msgpack package")
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.fmt = fmt
+        self.payload_size = payload_size
+        self.burst_size = burst_size
+        self.burst_every = burst_every
+        self.collapse_every = collapse_every
+        self.close_after = close_after
+        self.random = random.Random(seed)
+        self.server = None
+        self.sent = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def frame(self, seq, now):
+        phase = now % 60.0
+        entropy = 0.5 + 0.35 * math.sin(phase * 0.5) + self.random.gauss(0, 0.02)
+        coherence = 0.8 + 0.1 * math.cos(phase * 0.2) + self.random.gauss(0, 0.02)
+        if self.collapse_every and now % self.collapse_every < 0.25:
+            coherence *= 0.2
+            entropy = min(1.0, entropy + 0.3)
+        return {"timestamp": now, "seq": seq, "entropy": entropy, "coherence": coherence}
+
+    def encode(self, frame):
+        if self.fmt == "binary":
+            return encode_binary(frame["timestamp"], frame["seq"], frame["entropy"], frame["coherence"])
+        if self.payload_size:
+            frame["pad"] = ""
+            size = len(json.dumps(frame))
+            frame["pad"] = "x" * max(0, self.payload_size - size)
+        if self.fmt == "msgpack":
+            return msgpack.packb(frame)
+        return json.dumps(frame)
+
+    async def resume_point(self, ws):
+        try:
+            message = await asyncio.wait_for(ws.recv(), 0.05)
+            return json.loads(message)["resume_from"] + 1
+        except (asyncio.TimeoutError, ValueError, KeyError):
+            return 0
+
+    async def handler(self, ws):
+        try:
+            await self.stream(ws)
+        except ConnectionClosed:
+            pass
+
+    async def stream(self, ws):
+        seq = await self.resume_point(ws)
+        start = time.perf_counter()
+        next_burst = self.burst_every or math.inf
+        extra = 0
+        sent = 0
+        while not self.close_after or sent < self.close_after:
+            elapsed = time.perf_counter() - start
+            if elapsed >= next_burst:
+                extra += self.burst_size
+                next_burst += self.burst_every
+            due = int(elapsed * self.rate) + extra
+            if self.close_after:
+                due = min(due, self.close_after)
+            while sent < due:
+                await ws.send(self.encode(self.frame(seq, time.time())))
+                seq += 1
+                sent += 1
+                self.sent += 1
+            wait = (sent - extra + 1) / self.rate - (time.perf_counter() - start)
+            await asyncio.sleep(max(0.0, min(wait, next_burst - elapsed, 0.05)))
+        await ws.close(1001)
+
+    async def __aenter__(self):
+        self.server = await serve(self.handler, self.host, self.port, max_size=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def serve_forever(self):
+        async with self:
+            await self.server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the quantime stream endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=1000.0, help="frames per second per client")
+    parser.add_argument("--format", dest="fmt", choices=("json", "msgpack", "binary"), default="json")
+    parser.add_argument("--payload-size", type=int, default=0, help="pad json/msgpack frames to this many bytes")
+    parser.add_argument("--burst-size", type=int, default=0, help="extra frames sent at once every --burst-every seconds")
+    parser.add_argument("--burst-every", type=float, default=0.0)
+    parser.add_argument("--collapse-every", type=float, default=0.0, help="inject a coherence collapse every N seconds")
+    parser.add_argument("--close-after", type=int, default=0, help="drop each connection after N frames")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    simulator = QuantimeSimulator(**vars(args))
+    print(f"serving {simulator.url} at {args.rate:g} frames/s ({args.fmt})", flush=True)
+    try:
+        asyncio.run(simulator.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
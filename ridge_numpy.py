@@ -0,0 +1,36 @@
+import numpy as np
+
+# NumPy port of ridge_shader.glsl, evaluated in float32 like the GPU. The
+# shader only depends on pos.x, so each frame is computed as one row and
+# broadcast over the height; the returned frames are read-only views.
+
+LOW = np.array([0.2, 0.2, 0.8], np.float32)
+HIGH = np.array([0.8, 0.2, 0.2], np.float32)
+
+def pixel_x(width):
+    # gl_FragCoord samples pixel centres.
+    return (np.arange(width, dtype=np.float32) + np.float32(0.5)) / np.float32(width)
+
+def ridge_rows(times, entropy, coherence, width):
+    times = np.atleast_1d(np.asarray(times, np.float32))
+    entropy = np.broadcast_to(np.asarray(entropy, np.float32), times.shape)
+    coherence = np.broadcast_to(np.asarray(coherence, np.float32), times.shape)
+    ridge = np.sin(pixel_x(width) * np.float32(10.0) + times[:, None]) * coherence[:, None]
+    color = LOW * (np.float32(1.0) - entropy[:, None]) + HIGH * entropy[:, None]
+    rows = np.ones(times.shape + (width, 4), np.float32)
+    np.multiply(ridge[:, :, None], color[:, None, :], out=rows[..., :3])
+    return rows
+
+def to_rgba8(pixels):
+    # Same conversion as writing gl_FragColor to an RGBA8 framebuffer.
+    return np.rint(np.clip(pixels, 0.0, 1.0) * np.float32(255.0)).astype(np.uint8)
+
+def render_ridge_batch(times, entropy, coherence, width, height, rgba8=False):
+    rows = ridge_rows(times, entropy, coherence, width)
+    if rgba8:
+        rows = to_rgba8(rows)
+    # Image rows run top-down; the shader output is constant along y.
+    return np.broadcast_to(rows[:, None], (rows.shape[0], height, width, 4))
+
+def render_ridge(entropy, coherence, t, width, height, rgba8=False):
+    return render_ridge_batch(t, entropy, coherence, width, height, rgba8)[0]
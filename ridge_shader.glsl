@@ -1,9 +1,49 @@
+#ifdef QUANTIME_UBO
+// Member order and types must match shader_visualizer.STATE_FIELDS (std140).
+layout(std140) uniform QuantimeState {
+    vec2 resolution;
+    float entropy;
+    float coherence;
+    float time;
+};
+#else
 uniform float entropy;
 uniform float coherence;
+uniform float time;
+uniform vec2 resolution;
+#endif
+
+#ifdef QUANTIME_HISTORY
+// One row per stream of (entropy, coherence, time) samples; the ring's
+// newest column for each row is history_heads[row] - 1.
+uniform sampler2D history;
+uniform float history_length;
+uniform float history_heads[QUANTIME_HISTORY_STREAMS];
+#endif
+
+#ifdef QUANTIME_TILES
+// Position within the tile and the tile's (entropy, coherence), from
+// shader_visualizer.TILE_VERTEX_SHADER.
+varying vec2 tile;
+varying vec2 tile_state;
+#endif
 
 void main() {
     vec2 pos = gl_FragCoord.xy / resolution.xy;
-    float ridge = sin(pos.x * 10.0 + time) * coherence;
-    vec3 color = mix(vec3(0.2,0.2,0.8), vec3(0.8,0.2,0.2), entropy);
+    vec3 state = vec3(entropy, coherence, time);
+#if defined(QUANTIME_HISTORY)
+    // Waterfall: one horizontal band per stream, newest sample at the top,
+    // each scanline drawing the ridge as it was that many samples ago.
+    float band = floor(pos.y * float(QUANTIME_HISTORY_STREAMS));
+    float age = floor((1.0 - fract(pos.y * float(QUANTIME_HISTORY_STREAMS))) * history_length);
+    float column = history_heads[int(band)] - age - 0.5;
+    state = texture2D(history, vec2(column / history_length,
+                                    (band + 0.5) / float(QUANTIME_HISTORY_STREAMS))).rgb;
+#elif defined(QUANTIME_TILES)
+    pos = tile;
+    state.xy = tile_state;
+#endif
+    float ridge = sin(pos.x * 10.0 + state.z) * state.y;
+    vec3 color = mix(vec3(0.2,0.2,0.8), vec3(0.8,0.2,0.2), state.x);
     gl_FragColor = vec4(color * ridge, 1.0);
 }
@@ -0,0 +1,264 @@
+import functools, math, time
+from collections import deque
+import numpy as np
+
+def _suffix_candidates(values, start, less):
+    # Entries of `values` that beat everything after them: exactly the ones a
+    # monotonic min (less=np.less) or max (np.greater) deque keeps.
+    best = (np.minimum if less is np.less else np.maximum).accumulate(values[::-1])[::-1]
+    keep = np.ones(len(values), bool)
+    keep[:-1] = less(values[:-1], best[1:])
+    index = np.flatnonzero(keep)
+    return zip((index + start).tolist(), values[index].tolist())
+
+class RollingWindow:
+    # Mean/variance over the last `size` samples by sliding Welford updates
+    # (Chan's pairwise merge for blocks), min/max from monotonic deques and
+    # percentiles from a fixed-bin histogram sketch over [lo, hi]. add() and
+    # add_block() are O(1) amortised per sample and can be mixed freely.
+    def __init__(self, size, lo=0.0, hi=1.0, bins=1024, resync=16):
+        self.size = size
+        self.lo = lo
+        self.hi = hi
+        self.bins = bins
+        self.scale = bins / (hi - lo)
+        self.histogram = np.zeros(bins, np.int64)
+        self.ring = np.zeros(size, np.float64)
+        self.total = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._min = deque()
+        self._max = deque()
+        self._resync = resync * size
+        self._next_resync = self._resync
+
+    def _bin(self, value):
+        return min(max(int((value - self.lo) * self.scale), 0), self.bins - 1)
+
+    def _bins(self, values):
+        return np.clip(((values - self.lo) * self.scale).astype(np.int64), 0, self.bins - 1)
+
+    def add(self, value):
+        value = float(value)
+        index = self.total
+        slot = index % self.size
+        if self.count < self.size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+        else:
+            old = float(self.ring[slot])
+            self.histogram[self._bin(old)] -= 1
+            delta = value - old
+            old_mean = self.mean
+            self.mean += delta / self.size
+            self._m2 += delta * (value - self.mean + old - old_mean)
+        self.ring[slot] = value
+        self.histogram[self._bin(value)] += 1
+        self.total += 1
+        expired = index - self.size
+        for queue, beaten in ((self._min, value.__le__), (self._max, value.__ge__)):
+            while queue and beaten(queue[-1][1]):
+                queue.pop()
+            queue.append((index, value))
+            while queue[0][0] <= expired:
+                queue.popleft()
+
+    def add_block(self, values):
+        values = np.asarray(values, np.float64)
+        n = len(values)
+        if not n:
+            return
+        if n >= self.size:
+            self._reset(values[-self.size:], self.total + n - self.size)
+            return
+        slots = (self.total + np.arange(n)) % self.size
+        evicted = self.ring[slots[max(0, self.size - self.count):]]
+        if len(evicted):
+            self._remove(evicted)
+            np.subtract.at(self.histogram, self._bins(evicted), 1)
+        self._merge(values)
+        self.ring[slots] = values
+        self.histogram += np.bincount(self._bins(values), minlength=self.bins)
+        start = self.total
+        self.total += n
+        expired = self.total - 1 - self.size
+        low, high = values.min(), values.max()
+        for queue, less, edge in ((self._min, np.less, low), (self._max, np.greater, high)):
+            while queue and not less(queue[-1][1], edge):
+                queue.pop()
+            queue.extend(_suffix_candidates(values, start, less))
+            while queue[0][0] <= expired:
+                queue.popleft()
+        if self.total >= self._next_resync:
+            self._resync_moments()
+
+    def _merge(self, values):
+        n = len(values)
+        mean = values.mean()
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def _remove(self, values):
+        n = len(values)
+        rest = self.count - n
+        if rest <= 0:
+            self.count, self.mean, self._m2 = 0, 0.0, 0.0
+            return
+        mean = values.mean()
+        m2 = float(((values - mean) ** 2).sum())
+        rest_mean = (self.count * self.mean - n * mean) / rest
+        delta = rest_mean - mean
+        self._m2 -= m2 + delta * delta * n * rest / self.count
+        self.mean = rest_mean
+        self.count = rest
+
+    def _reset(self, window, first):
+        slots = (first + np.arange(self.size)) % self.size
+        self.ring[slots] = window
+        self.total = first + self.size
+        self.count = self.size
+        self.histogram = np.bincount(self._bins(window), minlength=self.bins).astype(np.int64)
+        self._min = deque(_suffix_candidates(window, first, np.less))
+        self._max = deque(_suffix_candidates(window, first, np.greater))
+        self._resync_moments()
+
+    def _resync_moments(self):
+        # Sliding updates accumulate rounding error; recompute exactly from
+        # the ring every `resync` windows' worth of samples.
+        window = self.ring if self.count == self.size else self.ring[:self.count]
+        self.mean = float(window.mean())
+        self._m2 = float(((window - self.mean) ** 2).sum())
+        self._next_resync = self.total + self._resync
+
+    @property
+    def variance(self):
+        return max(self._m2, 0.0) / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else math.nan
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else math.nan
+
+    def percentile(self, q):
+        # Accurate to one histogram bin, (hi - lo) / bins.
+        if not self.count:
+            return math.nan
+        rank = q / 100 * (self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.histogram), rank, side="right"))
+        return self.lo + (min(index, self.bins - 1) + 0.5) / self.scale
+
+    def summary(self, percentiles=(50, 95, 99)):
+        stats = {"count": self.count, "mean": self.mean, "std": self.std, "min": self.min, "max": self.max}
+        for q in percentiles:
+            stats[f"p{q}"] = self.percentile(q)
+        return stats
+
+class Ewma:
+    def __init__(self, alpha=0.05):
+        self.alpha = alpha
+        self.value = math.nan
+
+    def add(self, value):
+        self.value = value if self.value != self.value else self.value + self.alpha * (value - self.value)
+
+    def add_block(self, values):
+        values = np.asarray(values, np.float64)
+        if not len(values):
+            return
+        if self.value != self.value:
+            self.value, values = float(values[0]), values[1:]
+        # y_n = (1-a)^n y_0 + a * sum_k (1-a)^(n-1-k) x_k
+        decay = (1.0 - self.alpha) ** np.arange(len(values) - 1, -1, -1)
+        self.value = float((1.0 - self.alpha) ** len(values) * self.value + self.alpha * decay @ values)
+
+class StreamStats:
+    # Stream sink keeping several rolling windows and an EWMA per field.
+    # Calling it with a frame only appends to per-field lists; they are folded
+    # in with NumPy block updates every `block` frames or `max_delay` seconds,
+    # so the reader pays a couple of list appends per frame. With
+    # `on_report`, summary() is passed to it at most every `report_interval`
+    # seconds, checked at each flush.
+    def __init__(self, fields=("entropy", "coherence"), windows=(100, 1000, 10000), alpha=0.05,
+                 block=4096, max_delay=0.25, lo=0.0, hi=1.0, bins=1024, report_interval=1.0, on_report=None):
+        self.fields = fields
+        self.windows = {field: {size: RollingWindow(size, lo, hi, bins) for size in windows} for field in fields}
+        self.ewma = {field: Ewma(alpha) for field in fields}
+        self.block = block
+        self.max_delay = max_delay
+        self._pending = {field: [] for field in fields}
+        self._count = 0
+        self._deadline = time.monotonic() + max_delay
+        self.report_interval = report_interval
+        self.on_report = on_report
+        self._next_report = time.monotonic() + report_interval
+
+    def __call__(self, frame):
+        for field, values in self._pending.items():
+            values.append(frame[field])
+        self._count += 1
+        if self._count >= self.block or time.monotonic() >= self._deadline:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, {field: [] for field in self.fields}
+        self._count = 0
+        now = time.monotonic()
+        self._deadline = now + self.max_delay
+        self.update_block(**pending)
+        if self.on_report is not None and now >= self._next_report:
+            self._next_report = now + self.report_interval
+            self.on_report(self.summary())
+
+    def update_block(self, **columns):
+        for field, values in columns.items():
+            values = np.asarray(values, np.float64)
+            for window in self.windows[field].values():
+                window.add_block(values)
+            self.ewma[field].add_block(values)
+
+    def summary(self):
+        return {field: {"ewma": self.ewma[field].value,
+                        **{size: window.summary() for size, window in windows.items()}}
+                for field, windows in self.windows.items()}
+
+class SourceStats:
+    # One StreamStats per frame["source"] (see stream_bridge.fan_in), created
+    # on first sight with the same options, so nodes are not pooled together.
+    # `on_report` is called as on_report(source, summary).
+    def __init__(self, on_report=None, **options):
+        self.on_report = on_report
+        self.options = options
+        self.stats = {}
+
+    def __call__(self, frame):
+        source = frame.get("source")
+        stats = self.stats.get(source)
+        if stats is None:
+            report = None if self.on_report is None else functools.partial(self.on_report, source)
+            stats = self.stats[source] = StreamStats(on_report=report, **self.options)
+        stats(frame)
+
+def format_summary(summary, source=None):
+    # One line per field: the EWMA, then each window as size: count and stats.
+    prefix = "" if source is None else f"source={source} "
+    lines = []
+    for field, stats in summary.items():
+        windows = [f"{size}: n={window['count']} " + " ".join(f"{key}={value:.4f}" for key, value in window.items()
+                                                              if key != "count")
+                   for size, window in stats.items() if size != "ewma"]
+        lines.append(" | ".join([f"{prefix}{field:9s} ewma={stats['ewma']:.4f}", *windows]))
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+import argparse, csv, json, os, shutil, subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from image_io import write_png
+from quantime_recorder import read_recording
+from ridge_numpy import ridge_rows, to_rgba8
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".avi")
+
+def load_session(path):
+    # A Recorder log (memory-mapped, not loaded), JSON lines of stream frames,
+    # or CSV with timestamp,entropy,coherence columns.
+    if path.endswith(".qtm"):
+        records = read_recording(path)
+        return records["timestamp"], records["entropy"], records["coherence"]
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            rows = [(float(r["timestamp"]), float(r["entropy"]), float(r["coherence"])) for r in csv.DictReader(f)]
+        else:
+            frames = (json.loads(line) for line in f if line.strip())
+            rows = [(float(d["timestamp"]), float(d["entropy"]), float(d["coherence"])) for d in frames]
+    rows.sort()
+    samples = np.array(rows, np.float64).reshape(-1, 3)
+    return samples[:, 0], samples[:, 1], samples[:, 2]
+
+def frame_states(timestamps, entropy, coherence, fps, start=None, end=None):
+    # Each frame shows the newest sample at or before its time, as the live
+    # latest-value render loop would have. Frame times are compared with a
+    # thousandth of a frame of slack, so samples exactly on the frame grid
+    # (e.g. recorded at the export fps) are not lost to rounding.
+    if not len(timestamps):
+        raise ValueError("session has no samples to export")
+    start = timestamps[0] if start is None else start
+    end = timestamps[-1] if end is None else end
+    slack = 1e-3 / fps
+    times = start + np.arange(int((end - start) * fps + 1e-3) + 1) / fps
+    index = np.maximum(np.searchsorted(timestamps, times + slack, side="right") - 1, 0)
+    return times - start, np.asarray(entropy[index], np.float32), np.asarray(coherence[index], np.float32)
+
+def _render_chunk(first, times, entropy, coherence, width, height, out_dir):
+    rows = to_rgba8(ridge_rows(times, entropy, coherence, width))
+    if out_dir is None:
+        return rows
+    for i, row in enumerate(rows):
+        write_png(os.path.join(out_dir, f"frame_{first + i:06d}.png"), np.broadcast_to(row, (height, width, 4)))
+    return None
+
+def _open_encoder(out, fps, width, height):
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("video export needs ffmpeg on PATH; export to a directory for PNG frames instead")
+    return subprocess.Popen(["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                             "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                             "-pix_fmt", "yuv420p", "-c:v", "libx264", out], stdin=subprocess.PIPE)
+
+def export_session(timestamps, entropy, coherence, out, fps=30.0, width=640, height=360,
+                   workers=None, chunk=64, start=None, end=None):
+    times, frame_entropy, frame_coherence = frame_states(timestamps, entropy, coherence, fps, start, end)
+    video = out.lower().endswith(VIDEO_EXTENSIONS)
+    encoder = _open_encoder(out, fps, width, height) if video else None
+    if not video:
+        os.makedirs(out, exist_ok=True)
+    # Workers render whole chunks; for video they return one row per frame
+    # (the shader is constant along y) and only `workers * 2` chunks are in
+    # flight, so memory stays flat however long the session is.
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+
+    def flush(keep):
+        while len(pending) > keep:
+            rows = pending.popleft().result()
+            if encoder is not None:
+                for row in rows:
+                    encoder.stdin.write(np.broadcast_to(row, (height, width, 4)).tobytes())
+
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            for first in range(0, len(times), chunk):
+                part = slice(first, first + chunk)
+                pending.append(pool.submit(_render_chunk, first, times[part], frame_entropy[part],
+                                           frame_coherence[part], width, height, None if video else out))
+                flush(2 * workers)
+            flush(0)
+        finally:
+            if encoder is not None:
+                encoder.stdin.close()
+                if encoder.wait():
+                    raise RuntimeError(f"ffmpeg exited with status {encoder.returncode}")
+    return len(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a recorded quantime session to PNG frames or a video.")
+    parser.add_argument("session", help="recorded session (.qtm, .jsonl or .csv)")
+    parser.add_argument("out", help="output directory for PNG frames, or a video file (needs ffmpeg)")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk", type=int, default=64, help="frames per worker task")
+    args = parser.parse_args(argv)
+    width, height = (int(v) for v in args.size.split("x"))
+    try:
+        frames = export_session(*load_session(args.session), args.out, args.fps, width, height, args.workers,
+                                args.chunk)
+    except ValueError as exc:
+        raise SystemExit(f"{args.session}: {exc}")
+    print(f"wrote {frames} frames to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,950 @@
+import ctypes, hashlib, math, os, queue, struct, sys, threading, time
+from collections import deque
+
+# GPU-less servers have no display for glfw, so render through EGL instead
+# (Mesa's llvmpipe when there is no GPU). PyOpenGL binds its platform on first
+# import, so the choice has to be made before OpenGL is imported.
+HEADLESS = os.environ.get("QUANTIME_HEADLESS", "") not in ("", "0") or (
+    sys.platform.startswith("linux") and not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"))
+if HEADLESS:
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import numpy as np
 import OpenGL.GL as gl
+# PyOpenGL's array-converting wrapper costs more than the upload itself;
+# UniformBlock and HistoryTexture pass ready pointers, so they call the entry
+# points directly.
+from OpenGL.raw.GL.VERSION.GL_1_5 import glBufferSubData as buffer_sub_data
+from OpenGL.raw.GL.VERSION.GL_1_1 import glTexSubImage2D as tex_sub_image_2d
+from OpenGL.raw.GL.VERSION.GL_2_0 import glUniform1fv as uniform_1fv
 import glfw
+from image_io import write_png
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+SHADER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ridge_shader.glsl")
+GLSL_HEADER = "#version 120\n"
+# Same dialect plus uniform blocks; selects the QUANTIME_UBO branch of the shader.
+UBO_HEADER = GLSL_HEADER + "#extension GL_ARB_uniform_buffer_object : require\n#define QUANTIME_UBO\n"
+UBO_BLOCK = "QuantimeState"
+# (name, float count) in block order; extend together with the shader block.
+STATE_FIELDS = (("resolution", 2), ("entropy", 1), ("coherence", 1), ("time", 1))
+# Appended to either header; selects the waterfall branch of the shader.
+HISTORY_DEFINES = "#define QUANTIME_HISTORY\n#define QUANTIME_HISTORY_STREAMS {streams}\n"
+TILES_DEFINES = "#define QUANTIME_TILES\n"
+
+VERTEX_SHADER = """
+attribute vec2 position;
+
+void main() {
+    gl_Position = vec4(position, 0.0, 1.0);
+}
+"""
+
+# One instance per stream: the quad is scaled into grid cell gl_InstanceID
+# (row-major from the top left) and the stream's (entropy, coherence)
+# arrives as a per-instance attribute.
+TILE_VERTEX_SHADER = """
+#extension GL_ARB_draw_instanced : require
+attribute vec2 position;
+attribute vec2 state;
+uniform vec2 grid;
+varying vec2 tile;
+varying vec2 tile_state;
+
+void main() {
+    float id = float(gl_InstanceIDARB);
+    vec2 cell = vec2(mod(id, grid.x), floor(id / grid.x));
+    tile = position * 0.5 + 0.5;
+    vec2 corner = (cell + 0.03 + tile * 0.94) / grid;
+    gl_Position = vec4(corner.x * 2.0 - 1.0, 1.0 - corner.y * 2.0, 0.0, 1.0);
+    tile_state = state;
+}
+"""
+
+QUAD = (gl.GLfloat * 8)(-1.0, -1.0, 1.0, -1.0, -1.0, 1.0, 1.0, 1.0)
+
+def std140_dtype(fields):
+    # float/vec2/vec3/vec4 members align to 4/8/16/16 bytes and the block
+    # size rounds up to a vec4, so the array's bytes are the block verbatim.
+    names, formats, offsets, offset = [], [], [], 0
+    for name, size in fields:
+        align = 4 if size == 1 else 8 if size == 2 else 16
+        offset = -(-offset // align) * align
+        names.append(name)
+        formats.append("<f4" if size == 1 else ("<f4", (size,)))
+        offsets.append(offset)
+        offset += 4 * size
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": -(-offset // 16) * 16})
+
+def supports_ubo():
+    version = gl.glGetString(gl.GL_VERSION).split()[0].split(b".")
+    if (int(version[0]), int(version[1])) >= (3, 1):
+        return True
+    extensions = gl.glGetString(gl.GL_EXTENSIONS) or b""
+    return b"GL_ARB_uniform_buffer_object" in extensions.split()
+
+def supports_program_binary():
+    version = gl.glGetString(gl.GL_VERSION).split()[0].split(b".")
+    if (int(version[0]), int(version[1])) >= (4, 1):
+        return True
+    extensions = gl.glGetString(gl.GL_EXTENSIONS) or b""
+    return b"GL_ARB_get_program_binary" in extensions.split()
+
+def compile_shader(source, kind):
+    shader = gl.glCreateShader(kind)
+    gl.glShaderSource(shader, source)
+    gl.glCompileShader(shader)
+    if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+        log = gl.glGetShaderInfoLog(shader)
+        gl.glDeleteShader(shader)
+        raise RuntimeError(f"shader compilation failed: {log.decode(errors='replace')}")
+    return shader
+
+def link_program(*shaders, attributes=("position",), retrievable=False):
+    program = gl.glCreateProgram()
+    for shader in shaders:
+        gl.glAttachShader(program, shader)
+    for index, name in enumerate(attributes):
+        gl.glBindAttribLocation(program, index, name)
+    if retrievable:
+        gl.glProgramParameteri(program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+    gl.glLinkProgram(program)
+    for shader in shaders:
+        gl.glDetachShader(program, shader)
+        gl.glDeleteShader(shader)
+    if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+        log = gl.glGetProgramInfoLog(program)
+        gl.glDeleteProgram(program)
+        raise RuntimeError(f"shader link failed: {log.decode(errors='replace')}")
+    return program
+
+class ShaderProgram:
+    UNIFORMS = ("entropy", "coherence", "time", "resolution")
+
+    def __init__(self, fragment_source, vertex_source=VERTEX_SHADER, header=GLSL_HEADER, attributes=("position",),
+                 cache=None):
+        sources = (header + vertex_source, header + fragment_source)
+        self.program = cache.load(sources, attributes) if cache is not None else 0
+        if not self.program:
+            retrievable = cache is not None and cache.enabled
+            self.program = link_program(compile_shader(sources[0], gl.GL_VERTEX_SHADER),
+                                        compile_shader(sources[1], gl.GL_FRAGMENT_SHADER),
+                                        attributes=attributes, retrievable=retrievable)
+            if retrievable:
+                cache.store(self.program, sources, attributes)
+        # Resolved once at link time; -1 (optimised out) is a silent no-op in glUniform*.
+        self.locations = {name: gl.glGetUniformLocation(self.program, name) for name in self.UNIFORMS}
+        self._entropy = self.locations["entropy"]
+        self._coherence = self.locations["coherence"]
+        self._time = self.locations["time"]
+        self._resolution = self.locations["resolution"]
+
+    @classmethod
+    def from_file(cls, path=SHADER_PATH, **kwargs):
+        with open(path) as f:
+            return cls(f.read(), **kwargs)
+
+    def use(self):
+        gl.glUseProgram(self.program)
+
+    def set_uniforms(self, entropy=None, coherence=None, time=None, resolution=None):
+        if entropy is not None:
+            gl.glUniform1f(self._entropy, entropy)
+        if coherence is not None:
+            gl.glUniform1f(self._coherence, coherence)
+        if time is not None:
+            gl.glUniform1f(self._time, time)
+        if resolution is not None:
+            gl.glUniform2f(self._resolution, *resolution)
+
+    def delete(self):
+        gl.glDeleteProgram(self.program)
+        self.program = 0
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "quantime", "shaders")
+
+class ShaderManager:
+    # Builds ShaderPrograms from shader files through an on-disk cache of
+    # linked program binaries (glGetProgramBinary), keyed by a hash of the
+    # full sources, attribute bindings and the driver's vendor, renderer and
+    # version strings, so a warm start skips compilation entirely. A binary
+    # the driver rejects (e.g. after an update that keeps the version
+    # string) is deleted and rebuilt. cache_dir=None disables the cache, as
+    # does a context without GL 4.1 / ARB_get_program_binary or without
+    # binary formats (e.g. the macOS 2.1 context). With watch=True, changed() polls
+    # the files' mtimes at most every `interval` seconds; the RenderLoop then
+    # relinks the visualizer on its own thread without touching the stream.
+    HEADER = struct.Struct("<I")
+
+    def __init__(self, cache_dir=None, watch=False, interval=0.5):
+        self.cache_dir = cache_dir
+        self.watch = watch
+        self.interval = interval
+        self.hits = 0
+        self.misses = 0
+        self._enabled = None
+        self._mtimes = {}
+        self._next_check = 0.0
+
+    @property
+    def enabled(self):
+        # Needs a current context the first time.
+        if self._enabled is None:
+            try:
+                self._enabled = (bool(self.cache_dir) and supports_program_binary()
+                                 and gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS) > 0)
+            except gl.GLError:
+                self._enabled = False
+            if self._enabled:
+                os.makedirs(self.cache_dir, exist_ok=True)
+        return self._enabled
+
+    def program(self, path=SHADER_PATH, **kwargs):
+        if self.watch:
+            self._mtimes[path] = os.stat(path).st_mtime_ns
+        with open(path) as f:
+            return ShaderProgram(f.read(), cache=self, **kwargs)
+
+    def _path(self, sources, attributes):
+        key = hashlib.sha256()
+        for part in (*sources, *attributes, *(gl.glGetString(name) or b"" for name in
+                                              (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION))):
+            key.update(part if isinstance(part, bytes) else part.encode())
+            key.update(b"\0")
+        return os.path.join(self.cache_dir, key.hexdigest() + ".bin")
+
+    def load(self, sources, attributes):
+        # A linked program, or 0 on a miss.
+        if not self.enabled:
+            return 0
+        path = self._path(sources, attributes)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return 0
+        program = gl.glCreateProgram()
+        try:
+            binary = data[self.HEADER.size:]
+            gl.glProgramBinary(program, self.HEADER.unpack_from(data)[0], binary, len(binary))
+            if gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+                self.hits += 1
+                return program
+        except (struct.error, gl.GLError):
+            pass
+        gl.glDeleteProgram(program)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self.misses += 1
+        return 0
+
+    def store(self, program, sources, attributes):
+        length = gl.glGetProgramiv(program, gl.GL_PROGRAM_BINARY_LENGTH)
+        if not length:
+            return
+        binary = (ctypes.c_ubyte * length)()
+        size, format = gl.GLsizei(), gl.GLenum()
+        gl.glGetProgramBinary(program, length, ctypes.byref(size), ctypes.byref(format), binary)
+        path = self._path(sources, attributes)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, "wb") as f:
+                f.write(self.HEADER.pack(format.value) + bytes(binary)[:size.value])
+            os.replace(temporary, path)
+        except OSError:
+            # An unwritable cache only costs the next start a compile.
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def changed(self, now=None):
+        # Render thread, once per frame: True when a file loaded through
+        # program() has been modified since.
+        if not self._mtimes:
+            return False
+        now = time.perf_counter() if now is None else now
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.interval
+        changed = False
+        for path, mtime in self._mtimes.items():
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if current != mtime:
+                self._mtimes[path] = current
+                changed = True
+        return changed
+
+class UniformBlock:
+    # Host copy of a std140 uniform block as a one-record NumPy array. Fields
+    # are written in place through `values` (a float32 view, indexed by
+    # `slots`) and upload() sends the whole block with one glBufferSubData.
+    # The buffer stays bound to GL_UNIFORM_BUFFER, which nothing else uses.
+    def __init__(self, program, name=UBO_BLOCK, fields=STATE_FIELDS, binding=0):
+        self.state = np.zeros(1, std140_dtype(fields))
+        index = gl.glGetUniformBlockIndex(program, name)
+        if index == gl.GL_INVALID_INDEX:
+            raise RuntimeError(f"shader has no uniform block {name!r}")
+        size = gl.GLint()
+        gl.glGetActiveUniformBlockiv(program, index, gl.GL_UNIFORM_BLOCK_DATA_SIZE, ctypes.byref(size))
+        if size.value != self.state.nbytes:
+            raise RuntimeError(f"uniform block {name!r} is {size.value} bytes, fields describe {self.state.nbytes}")
+        gl.glUniformBlockBinding(program, index, binding)
+        self.values = self.state.view(np.float32)
+        self.slots = {name: self.state.dtype.fields[name][1] // 4 for name, _ in fields}
+        self.nbytes = self.state.nbytes
+        self.pointer = ctypes.c_void_p(self.state.ctypes.data)
+        self.buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.buffer)
+        gl.glBufferData(gl.GL_UNIFORM_BUFFER, self.nbytes, self.pointer, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBufferBase(gl.GL_UNIFORM_BUFFER, binding, self.buffer)
+
+    def upload(self):
+        buffer_sub_data(gl.GL_UNIFORM_BUFFER, 0, self.nbytes, self.pointer)
+
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.buffer])
+
+def _stream_row(rows, streams, frame):
+    # Row for frame["source"], assigned in order of first appearance;
+    # untagged frames share one row, sources past `streams` get None.
+    source = frame.get("source")
+    row = rows.get(source)
+    if row is None and len(rows) < streams:
+        row = rows[source] = len(rows)
+    return row
+
+class History:
+    # The last `length` (entropy, coherence, time) samples of up to `streams`
+    # sources, one ring row per source (see _stream_row). A stream sink: call
+    # it with every decoded frame. Written on the reader side only;
+    # HistoryTexture copies what is new to the GPU.
+    def __init__(self, length=1024, streams=1):
+        self.length = length
+        self.streams = streams
+        self.samples = np.zeros((streams, length, 3), np.float32)
+        self.written = [0] * streams
+        self.rows = {}
+        self.origin = None
+
+    def __call__(self, frame):
+        row = _stream_row(self.rows, self.streams, frame)
+        if row is None:
+            return
+        timestamp = frame.get("timestamp") or time.time()
+        if self.origin is None:
+            self.origin = timestamp
+        written = self.written[row]
+        self.samples[row, written % self.length] = (frame["entropy"], frame["coherence"], timestamp - self.origin)
+        self.written[row] = written + 1
+
+class HistoryTexture:
+    # GL_RGB32F texture mirroring a History, one row per stream. update()
+    # copies only the samples written since the last call (at most two
+    # glTexSubImage2D per row, split where the ring wraps), so the per-frame
+    # cost follows the sample rate, not the history length. The shader finds
+    # the newest column from `history_heads` and lets GL_REPEAT wrap the
+    # ring. Stays bound to texture unit 0, which nothing else uses.
+    def __init__(self, history, program):
+        limit = gl.glGetIntegerv(gl.GL_MAX_TEXTURE_SIZE)
+        if history.length > limit or history.streams > limit:
+            raise RuntimeError(f"history of {history.length}x{history.streams} exceeds the {limit}-texel texture limit")
+        self.history = history
+        self.uploaded = [0] * history.streams
+        self.heads = (gl.GLfloat * history.streams)()
+        self.address = history.samples.ctypes.data
+        self.texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        for name, value in ((gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST), (gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST),
+                            (gl.GL_TEXTURE_WRAP_S, gl.GL_REPEAT), (gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)):
+            gl.glTexParameteri(gl.GL_TEXTURE_2D, name, value)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB32F, history.length, history.streams, 0,
+                        gl.GL_RGB, gl.GL_FLOAT, history.samples)
+        self.attach(program)
+
+    def attach(self, program):
+        # Sets the program's sampler and length; call with it in use.
+        gl.glUniform1i(gl.glGetUniformLocation(program, "history"), 0)
+        gl.glUniform1f(gl.glGetUniformLocation(program, "history_length"), self.history.length)
+        self._heads = gl.glGetUniformLocation(program, "history_heads")
+
+    def update(self):
+        history = self.history
+        length, uploaded = history.length, self.uploaded
+        for row, written in enumerate(list(history.written)):
+            start = max(uploaded[row], written - length)
+            while start < written:
+                column = start % length
+                count = min(written - start, length - column)
+                tex_sub_image_2d(gl.GL_TEXTURE_2D, 0, column, row, count, 1, gl.GL_RGB, gl.GL_FLOAT,
+                                 ctypes.c_void_p(self.address + (row * length + column) * 12))
+                start += count
+            uploaded[row] = written
+            self.heads[row] = written % length
+        uniform_1fv(self._heads, history.streams, self.heads)
+
+    def delete(self):
+        gl.glDeleteTextures(1, [self.texture])
+
+class StreamStates:
+    # Newest (entropy, coherence) of up to `streams` sources, one row per
+    # source (see _stream_row). A stream sink, like History; TileInstances
+    # uploads the whole array each frame.
+    def __init__(self, streams=1):
+        self.streams = streams
+        self.values = np.zeros((streams, 2), np.float32)
+        self.rows = {}
+
+    def __call__(self, frame):
+        row = _stream_row(self.rows, self.streams, frame)
+        if row is not None:
+            self.values[row] = (frame["entropy"], frame["coherence"])
+
+class TileInstances:
+    # Per-instance attribute buffer for a StreamStates: one glBufferSubData
+    # and one glDrawArraysInstanced per frame however many streams there
+    # are. The grid is as close to square tiles as the viewport allows.
+    def __init__(self, states, program, location=1):
+        self.states = states
+        self.location = location
+        self.nbytes = states.values.nbytes
+        self.pointer = ctypes.c_void_p(states.values.ctypes.data)
+        self.buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.nbytes, self.pointer, gl.GL_DYNAMIC_DRAW)
+        self.attach(program)
+
+    def attach(self, program):
+        self._grid = gl.glGetUniformLocation(program, "grid")
+
+    def resize(self, width, height):
+        count = self.states.streams
+        columns = min(max(round(math.sqrt(count * width / height)), 1), count)
+        gl.glUniform2f(self._grid, columns, -(-count // columns))
+
+    def draw(self):
+        # Unlike the full-screen quad, the tiles leave gaps to clear (opaque,
+        # as exported PNGs keep the alpha channel).
+        gl.glClearColor(0.0, 0.0, 0.0, 1.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.buffer)
+        buffer_sub_data(gl.GL_ARRAY_BUFFER, 0, self.nbytes, self.pointer)
+        gl.glEnableVertexAttribArray(self.location)
+        gl.glVertexAttribPointer(self.location, 2, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+        gl.glVertexAttribDivisor(self.location, 1)
+        gl.glDrawArraysInstanced(gl.GL_TRIANGLE_STRIP, 0, 4, self.states.streams)
+
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.buffer])
+
+class Visualizer:
+    # ubo=None uses the uniform block path when the context supports it;
+    # False keeps one glUniform* call per field. With a History the shader
+    # draws it as a scrolling waterfall instead of the current state alone;
+    # with StreamStates it draws one tile per stream in a single instanced
+    # call. With a ShaderManager the program comes through its binary
+    # cache, and reload() relinks it from the shader file.
+    def __init__(self, width=800, height=600, shader_path=SHADER_PATH, ubo=None, history=None, tiles=None,
+                 shaders=None):
+        if history is not None and tiles is not None:
+            raise ValueError("history and tiles are separate display modes")
+        if ubo is None:
+            ubo = supports_ubo()
+        self.ubo = ubo
+        self.shader_path = shader_path
+        self.shaders = shaders
+        self.options = {"header": UBO_HEADER if ubo else GLSL_HEADER}
+        if history is not None:
+            self.options["header"] += HISTORY_DEFINES.format(streams=history.streams)
+        if tiles is not None:
+            self.options = {"vertex_source": TILE_VERTEX_SHADER, "header": self.options["header"] + TILES_DEFINES,
+                            "attributes": ("position", "state")}
+        self.program = self._link()
+        self.block = UniformBlock(self.program.program) if ubo else None
+        self.quad = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.quad)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, gl.sizeof(QUAD), QUAD, gl.GL_STATIC_DRAW)
+        self.entropy = 0.0
+        self.coherence = 0.0
+        self.updates = 0
+        self.started = time.perf_counter()
+        self.program.use()
+        self.history = HistoryTexture(history, self.program.program) if history is not None else None
+        self.tiles = TileInstances(tiles, self.program.program) if tiles is not None else None
+        self.resize(width, height)
+
+    def _link(self):
+        if self.shaders is not None:
+            return self.shaders.program(self.shader_path, **self.options)
+        return ShaderProgram.from_file(self.shader_path, **self.options)
+
+    def reload(self):
+        # GL thread. A shader that fails to build is reported and the
+        # running program kept, so a bad edit does not stop rendering.
+        try:
+            program = self._link()
+        except (OSError, RuntimeError) as exc:
+            print(f"shader reload failed: {str(exc).strip()}", file=sys.stderr, flush=True)
+            return False
+        previous, self.program = self.program, program
+        program.use()
+        if self.block is not None:
+            self.block.delete()
+            self.block = UniformBlock(program.program)
+        for part in (self.history, self.tiles):
+            if part is not None:
+                part.attach(program.program)
+        self.resize(*self.resolution)
+        previous.delete()
+        return True
+
+    def resize(self, width, height):
+        self.resolution = (width, height)
+        gl.glViewport(0, 0, width, height)
+        if self.block is not None:
+            slot = self.block.slots["resolution"]
+            self.block.values[slot:slot + 2] = self.resolution
+        else:
+            self.program.set_uniforms(resolution=self.resolution)
+        if self.tiles is not None:
+            self.tiles.resize(width, height)
+
+    def set_state(self, entropy, coherence):
+        # Only stores the values, so any thread may call it; draw() uploads
+        # them on the thread that owns the GL context.
+        self.entropy = entropy
+        self.coherence = coherence
+        self.updates += 1
+
+    def draw(self, now=None):
+        now = time.perf_counter() if now is None else now
+        block = self.block
+        if block is not None:
+            values, slots = block.values, block.slots
+            values[slots["entropy"]] = self.entropy
+            values[slots["coherence"]] = self.coherence
+            values[slots["time"]] = now - self.started
+            block.upload()
+        else:
+            self.program.set_uniforms(self.entropy, self.coherence, now - self.started)
+        if self.history is not None:
+            self.history.update()
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.quad)
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(0, 2, gl.GL_FLOAT, gl.GL_FALSE, 0, None)
+        if self.tiles is not None:
+            self.tiles.draw()
+        else:
+            gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.quad])
+        if self.tiles is not None:
+            self.tiles.delete()
+        if self.block is not None:
+            self.block.delete()
+        if self.history is not None:
+            self.history.delete()
+        self.program.delete()
+
+class FrameStats:
+    def __init__(self, window=600):
+        self.work = deque(maxlen=window)
+        self.intervals = deque(maxlen=window)
+        self.frames = 0
+        self.late = 0
+        self._last = None
+
+    def add(self, start, end):
+        if self._last is not None:
+            self.intervals.append(start - self._last)
+        self._last = start
+        self.work.append(end - start)
+        self.frames += 1
+
+    def summary(self):
+        if not self.work:
+            return {"frames": 0}
+        work = sorted(self.work)
+        interval = sum(self.intervals) / len(self.intervals) if self.intervals else 0.0
+        return {
+            "frames": self.frames,
+            "late": self.late,
+            "fps": 1.0 / interval if interval else 0.0,
+            "mean_ms": sum(work) / len(work) * 1000,
+            "p95_ms": work[int(0.95 * (len(work) - 1))] * 1000,
+            "max_ms": work[-1] * 1000,
+        }
+
+class RenderLoop:
+    # Owns the GL context. Each frame it takes the newest stream state from
+    # `source` (any buffer with take(), e.g. stream_bridge.latest), advances
+    # `time` and sleeps to the next frame deadline, so rendering runs at its
+    # own rate regardless of how fast frames arrive. run() blocks and must be
+    # called on the main thread (glfw on macOS only allows windows there);
+    # stop() may be called from any thread. Every
+    # `export_interval` seconds the frame is captured asynchronously (see
+    # FrameCapture) and written to `export_dir` as PNG.
+    def __init__(self, source, fps=60.0, width=800, height=600, title="Awareness Ridge",
+                 shader_path=SHADER_PATH, report_interval=0.0, tracer=None, history=None, tiles=None,
+                 shaders=None, export_dir=None, export_interval=1.0):
+        self.source = source
+        self.fps = fps
+        self.size = (width, height)
+        self.title = title
+        self.shader_path = shader_path
+        self.report_interval = report_interval
+        self.tracer = tracer
+        self.history = history
+        self.tiles = tiles
+        self.shaders = shaders
+        self.export_dir = export_dir
+        self.export_interval = export_interval
+        self.capture = None
+        self.stats = FrameStats()
+        self.stopping = threading.Event()
+        self.visualizer = None
+
+    def create_context(self):
+        if not glfw.init():
+            raise RuntimeError("glfw initialisation failed")
+        window = glfw.create_window(*self.size, self.title, None, None)
+        if not window:
+            glfw.terminate()
+            raise RuntimeError("glfw window creation failed")
+        glfw.make_context_current(window)
+        glfw.swap_interval(0)
+        return window
+
+    def destroy_context(self, window):
+        glfw.destroy_window(window)
+        glfw.terminate()
+
+    def should_close(self, window):
+        return glfw.window_should_close(window)
+
+    def present(self, window):
+        glfw.swap_buffers(window)
+        glfw.poll_events()
+        size = glfw.get_framebuffer_size(window)
+        if size != self.visualizer.resolution and all(size):
+            self.visualizer.resize(*size)
+
+    def run(self):
+        global visualizer
+        window = self.create_context()
+        try:
+            self.visualizer = visualizer = Visualizer(*self.size, self.shader_path, history=self.history,
+                                                      tiles=self.tiles, shaders=self.shaders)
+            if self.export_dir:
+                self.capture = FrameCapture(PngExporter(self.export_dir))
+            self.loop(window)
+        finally:
+            if self.capture is not None:
+                self.capture.close()
+            if self.visualizer is not None:
+                self.visualizer.delete()
+            self.destroy_context(window)
+
+    def loop(self, window):
+        period = 1.0 / self.fps
+        deadline = next_report = next_export = time.perf_counter()
+        tracer = self.tracer
+        shaders = self.shaders
+        capture = self.capture
+        while not self.stopping.is_set() and not self.should_close(window):
+            start = time.perf_counter()
+            if shaders is not None and shaders.changed(start):
+                self.visualizer.reload()
+            data = self.source.take()
+            if data is not None:
+                self.visualizer.set_state(data["entropy"], data["coherence"])
+            if tracer:
+                tracer.taken(data)
+            self.visualizer.draw(start)
+            if tracer:
+                tracer.uploaded()
+            if capture is not None:
+                capture.poll()
+                if start >= next_export:
+                    next_export = start + self.export_interval
+                    capture.capture(*self.visualizer.resolution)
+            self.present(window)
+            if tracer:
+                tracer.swapped()
+            end = time.perf_counter()
+            self.stats.add(start, end)
+            if self.report_interval and end >= next_report:
+                next_report = end + self.report_interval
+                print("render", self.stats.summary(), flush=True)
+                if tracer:
+                    print("latency", tracer.summary(), flush=True)
+            deadline += period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -period:
+                # More than a frame behind: drop the debt instead of bursting.
+                self.stats.late += 1
+                deadline = time.perf_counter()
+
+    def stop(self):
+        self.stopping.set()
+
+class HeadlessContext:
+    def __init__(self):
+        from OpenGL import EGL
+        self.egl = EGL
+        self.display = self._display()
+        if not EGL.eglInitialize(self.display, None, None):
+            raise RuntimeError("EGL initialisation failed")
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        attributes = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                      EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+        if not EGL.eglChooseConfig(self.display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+            raise RuntimeError("no EGL config supports desktop OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        if not self.context:
+            raise RuntimeError("EGL context creation failed")
+        # Surfaceless: all drawing goes to a Framebuffer object.
+        if not EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context):
+            raise RuntimeError("EGL context could not be made current")
+
+    def _display(self):
+        EGL = self.egl
+        try:
+            from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+            display = eglGetPlatformDisplayEXT(EGL_PLATFORM_SURFACELESS_MESA, EGL.EGL_DEFAULT_DISPLAY, None)
+            if display:
+                return display
+        except Exception:
+            pass
+        return EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+
+    def release(self):
+        EGL = self.egl
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
+
+class Framebuffer:
+    def __init__(self, width, height):
+        self.size = (width, height)
+        self.fbo = gl.glGenFramebuffers(1)
+        self.color = gl.glGenRenderbuffers(1)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.color)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, width, height)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, self.color)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"framebuffer incomplete: 0x{status:x}")
+
+    def bind(self):
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glViewport(0, 0, *self.size)
+
+    def read_pixels(self):
+        width, height = self.size
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        data = gl.glReadPixels(0, 0, width, height, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        # GL rows start at the bottom; images start at the top.
+        return np.frombuffer(data, np.uint8).reshape(height, width, 4)[::-1]
+
+    def delete(self):
+        gl.glDeleteFramebuffers(1, [self.fbo])
+        gl.glDeleteRenderbuffers(1, [self.color])
+
+class FrameCapture:
+    # Asynchronous readback through a ring of `depth` pixel pack buffers.
+    # capture() (GL thread, after drawing) starts a glReadPixels into a free
+    # PBO and fences it; poll() (GL thread, once per frame) maps each PBO
+    # whose fence has signalled and hands `encode(pixels, index)` a NumPy
+    # view straight into the mapped buffer (top row first, RGBA) on a
+    # background thread. The buffer stays mapped until the encoder returns;
+    # the next poll() unmaps it and returns it to the ring. When every PBO
+    # is still in flight a capture is skipped rather than waited for, so
+    # the render thread never blocks on readback or encoding.
+    def __init__(self, encode, depth=3):
+        self.encode = encode
+        self.depth = depth
+        self.size = None
+        self.buffers = []
+        self.free = deque()
+        self.pending = deque()
+        self.mapped = {}
+        self.released = deque()
+        self.captured = 0
+        self.skipped = 0
+        self.errors = 0
+        self.jobs = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._encode, name="frame-encoder", daemon=True)
+        self.thread.start()
+
+    def _allocate(self, width, height):
+        if self.buffers:
+            gl.glDeleteBuffers(len(self.buffers), self.buffers)
+        self.size = (width, height)
+        self.buffers = list(gl.glGenBuffers(self.depth)) if self.depth > 1 else [gl.glGenBuffers(1)]
+        for buffer in self.buffers:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer)
+            gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, width * height * 4, None, gl.GL_STREAM_READ)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        self.free = deque(range(self.depth))
+
+    def capture(self, width, height):
+        if (width, height) != self.size:
+            # Reallocate only once nothing is in flight.
+            if self.pending or self.mapped:
+                self.skipped += 1
+                return False
+            self._allocate(width, height)
+        if not self.free:
+            self.skipped += 1
+            return False
+        index = self.free.popleft()
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[index])
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(0, 0, width, height, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append((index, gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)))
+        self.captured += 1
+        return True
+
+    def poll(self):
+        while self.released:
+            index = self.released.popleft()
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[index])
+            gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+            del self.mapped[index]
+            self.free.append(index)
+        width, height = self.size or (0, 0)
+        while self.pending:
+            index, fence = self.pending[0]
+            if gl.glClientWaitSync(fence, 0, 0) == gl.GL_TIMEOUT_EXPIRED:
+                break
+            self.pending.popleft()
+            gl.glDeleteSync(fence)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, self.buffers[index])
+            address = gl.glMapBufferRange(gl.GL_PIXEL_PACK_BUFFER, 0, width * height * 4, gl.GL_MAP_READ_BIT)
+            pixels = np.ctypeslib.as_array((ctypes.c_ubyte * (width * height * 4)).from_address(address))
+            self.mapped[index] = pixels
+            # GL rows start at the bottom; images start at the top.
+            self.jobs.put((index, pixels.reshape(height, width, 4)[::-1]))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+    def _encode(self):
+        # Linux nices individual threads: on a saturated CPU the render
+        # thread should win over encoding.
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            index, pixels = job
+            try:
+                self.encode(pixels, index)
+            except Exception as exc:
+                self.errors += 1
+                print(f"capture encoder failed: {exc}", file=sys.stderr, flush=True)
+            self.released.append(index)
+
+    def close(self):
+        # GL thread: finishes the frames already read back, then frees the
+        # buffers.
+        gl.glFinish()
+        self.poll()
+        self.jobs.put(None)
+        self.thread.join()
+        self.poll()
+        for _, fence in self.pending:
+            gl.glDeleteSync(fence)
+        self.pending.clear()
+        if self.buffers:
+            gl.glDeleteBuffers(len(self.buffers), self.buffers)
+            self.buffers = []
+
+class PngExporter:
+    # A FrameCapture encoder writing numbered PNGs into `directory`.
+    def __init__(self, directory, prefix="ridge"):
+        self.directory = directory
+        self.prefix = prefix
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, pixels, index=None):
+        write_png(os.path.join(self.directory, f"{self.prefix}_{self.written:06d}.png"), pixels)
+        self.written += 1
+
+class OffscreenRenderer:
+    def __init__(self, width=800, height=600, shader_path=SHADER_PATH):
+        self.context = HeadlessContext()
+        self.framebuffer = Framebuffer(width, height)
+        self.framebuffer.bind()
+        self.visualizer = Visualizer(width, height, shader_path)
+
+    def render(self, entropy, coherence, t):
+        self.visualizer.set_state(entropy, coherence)
+        self.visualizer.draw(self.visualizer.started + t)
+        return self.framebuffer.read_pixels()
+
+    def close(self):
+        self.visualizer.delete()
+        self.framebuffer.delete()
+        self.context.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class HeadlessRenderLoop(RenderLoop):
+    # Same pacing, stats and export as RenderLoop, drawing into an
+    # offscreen framebuffer. Stops after `max_frames` frames when set.
+    def __init__(self, source, max_frames=0, **kwargs):
+        super().__init__(source, **kwargs)
+        self.max_frames = max_frames
+
+    def create_context(self):
+        self.context = HeadlessContext()
+        self.framebuffer = Framebuffer(*self.size)
+        self.framebuffer.bind()
+
+    def destroy_context(self, window):
+        self.framebuffer.delete()
+        self.context.release()
+
+    def should_close(self, window):
+        return bool(self.max_frames) and self.stats.frames >= self.max_frames
+
+    def present(self, window):
+        gl.glFlush()
+
+visualizer = None
+
+def init_visualizer(width=800, height=600, shader_path=SHADER_PATH):
+    # For callers that manage their own GL context; RenderLoop sets the
+    # module visualizer itself.
+    global visualizer
+    visualizer = Visualizer(width, height, shader_path)
+    return visualizer
 
 def update_visualizer(data):
-    gl.glUniform1f(gl.glGetUniformLocation(shader, "entropy"), data["entropy"])
-    gl.glUniform1f(gl.glGetUniformLocation(shader, "coherence"), data["coherence"])
+    if visualizer is None:
+        raise RuntimeError("init_visualizer() must be called with a current GL context first")
+    visualizer.set_state(data["entropy"], data["coherence"])
@@ -0,0 +1,241 @@
+import platform, struct, time, warnings
+from multiprocessing import shared_memory
+import numpy as np
+
+# Cursors are monotonically increasing uint64 counters in the segment header;
+# the producer only writes `write`, the consumer only writes `read`. Each
+# side publishes its cursor after touching the slot, so no lock is needed:
+# they are accessed through a native "Q" memoryview cast, whose item stores
+# are single aligned 8-byte writes (struct.pack_into is not: it zero-fills
+# the field before packing, so a concurrent reader can see 0). That the
+# cursor store becomes visible after the slot bytes relies on x86's total
+# store order; Python has no fence to request it elsewhere, and weakly
+# ordered CPUs (ARM64, POWER) may publish the cursor first. There the rings
+# are only safe where something else orders the two, as FramePipeline's
+# semaphores do for each ByteRing handoff; RecordRing readers poll, so it
+# warns on such machines.
+STRONGLY_ORDERED = platform.machine().lower() in ("x86_64", "amd64", "i386", "i686", "x86")
+SLOT_HEADER = struct.Struct("<IB")
+
+class ByteRing:
+    # Single-producer/single-consumer ring of variable-length messages in
+    # fixed-size slots of a SharedMemory segment. Pickles as a reference to
+    # the segment, so it can be handed to worker processes.
+    HEADER = 64
+
+    def __init__(self, slots=4096, slot_size=1024, name=None):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = SLOT_HEADER.size + slot_size
+        size = self.HEADER + slots * self.stride
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.buf = self.shm.buf
+        if self.owner:
+            self.buf[:self.HEADER] = bytes(self.HEADER)
+        self.cursors = self.buf[:self.HEADER].cast("Q")
+
+    def __reduce__(self):
+        return type(self), (self.slots, self.slot_size, self.shm.name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        return self.cursors[0] - self.cursors[1]
+
+    def put(self, data):
+        # Returns False instead of blocking when the ring is full.
+        buf, cursors = self.buf, self.cursors
+        write = cursors[0]
+        if write - cursors[1] >= self.slots:
+            return False
+        text = isinstance(data, str)
+        if text:
+            data = data.encode()
+        size = len(data)
+        if size > self.slot_size:
+            raise ValueError(f"message of {size} bytes exceeds the {self.slot_size}-byte slot")
+        offset = self.HEADER + (write % self.slots) * self.stride
+        SLOT_HEADER.pack_into(buf, offset, size, text)
+        start = offset + SLOT_HEADER.size
+        buf[start:start + size] = data
+        cursors[0] = write + 1
+        return True
+
+    def get(self):
+        # Returns the oldest message (str or bytes, as put) or None when empty.
+        buf, cursors = self.buf, self.cursors
+        read = cursors[1]
+        if read >= cursors[0]:
+            return None
+        offset = self.HEADER + (read % self.slots) * self.stride
+        size, text = SLOT_HEADER.unpack_from(buf, offset)
+        start = offset + SLOT_HEADER.size
+        data = bytes(buf[start:start + size])
+        cursors[1] = read + 1
+        return data.decode() if text else data
+
+    def close(self):
+        self.cursors.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# Same layout as stream_bridge.FRAME_STRUCT (and the leading fields of a
+# recording), so binary frames and ring slots are interchangeable.
+FRAME_DTYPE = np.dtype([("timestamp", "<f8"), ("seq", "<u8"), ("entropy", "<f4"), ("coherence", "<f4")])
+FRAME = struct.Struct("<dQff")
+
+class RecordRing:
+    # Single-producer/multi-consumer ring of FRAME_DTYPE records in a
+    # SharedMemory segment. The header holds the write cursor and one read
+    # cursor (plus an attached flag) per consumer, each on its own cache line. Consumers get NumPy
+    # views straight into the segment, so nothing is copied or pickled.
+    # With overwrite=True (the default) the producer never waits: a consumer
+    # more than `slots` behind loses the oldest records (RingReader.lost).
+    # With overwrite=False put() returns False while the slowest attached
+    # consumer still has a full ring to read.
+    LINE = 64
+
+    def __init__(self, slots=65536, consumers=4, overwrite=True, name=None):
+        self.slots = slots
+        self.consumers = consumers
+        self.overwrite = overwrite
+        self.header = self.LINE * (1 + consumers)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner,
+                                              size=self.header + slots * FRAME_DTYPE.itemsize)
+        self.buf = self.shm.buf
+        if self.owner:
+            self.buf[:self.header] = bytes(self.header)
+        self.cursors = self.buf[:self.header].cast("Q")
+        self.records = np.ndarray(slots, FRAME_DTYPE, self.buf, self.header)
+        self.shed = 0
+        self._seq = 0
+        if self.owner and not STRONGLY_ORDERED:
+            warnings.warn(f"RecordRing assumes x86 store ordering; readers on {platform.machine()} may see "
+                          "records before they are complete", RuntimeWarning, stacklevel=2)
+
+    def __reduce__(self):
+        return type(self), (self.slots, self.consumers, self.overwrite, self.shm.name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        return self.cursors[0]
+
+    def _room(self, write, count):
+        if self.overwrite:
+            return True
+        cursors, stride = self.cursors, self.LINE // 8
+        for i in range(stride, (self.consumers + 1) * stride, stride):
+            if cursors[i + 1] and write + count - cursors[i] > self.slots:
+                self.shed += count
+                return False
+        return True
+
+    def put(self, frame):
+        # A stream sink: takes a decoded frame dict. Like the Recorder, a
+        # missing timestamp is the receive time and a missing seq continues
+        # from the previous frame.
+        write = self.cursors[0]
+        if not self._room(write, 1):
+            return False
+        seq = frame.get("seq")
+        if seq is None:
+            seq = self._seq
+        self._seq = seq + 1
+        timestamp = frame.get("timestamp")
+        FRAME.pack_into(self.buf, self.header + (write % self.slots) * FRAME.size,
+                        time.time() if timestamp is None else timestamp, seq, frame["entropy"], frame["coherence"])
+        self.cursors[0] = write + 1
+        return True
+
+    __call__ = put
+
+    def put_block(self, records):
+        # A FRAME_DTYPE array (or any array with those fields); at most `slots`.
+        count = len(records)
+        write = self.cursors[0]
+        if count > self.slots or not self._room(write, count):
+            return False
+        first = write % self.slots
+        split = min(count, self.slots - first)
+        for lo, hi, start in ((0, split, first), (split, count, 0)):
+            if hi > lo:
+                target = self.records[start:start + hi - lo]
+                for field in FRAME_DTYPE.names:
+                    target[field] = records[field][lo:hi]
+        self.cursors[0] = write + count
+        return True
+
+    def reader(self, index=0, start=None):
+        # Consumer `index` (0 <= index < consumers); each index must be used
+        # by one consumer at a time. Starts at the newest record by default.
+        return RingReader(self, index, start)
+
+    def close(self):
+        self.records = None
+        self.cursors.release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class RingReader:
+    def __init__(self, ring, index, start=None):
+        if not 0 <= index < ring.consumers:
+            raise ValueError(f"consumer index {index} out of range for {ring.consumers} consumers")
+        self.ring = ring
+        self.slot = (index + 1) * RecordRing.LINE // 8
+        self.position = ring.written if start is None else start
+        self.lost = 0
+        self.dropped = 0
+        ring.cursors[self.slot] = self.position
+        ring.cursors[self.slot + 1] = 1
+
+    def __len__(self):
+        return self.ring.written - self.position
+
+    def _catch_up(self, write):
+        behind = write - self.position - self.ring.slots
+        if behind > 0:
+            self.lost += behind
+            self.position += behind
+
+    def read(self, limit=None):
+        # View of the next contiguous run of unread records (empty when caught
+        # up; a run stops at the end of the ring, so call again for the rest).
+        # The view stays valid until the next read(); under overwrite=True
+        # only while the consumer stays within `slots` of the producer.
+        ring = self.ring
+        ring.cursors[self.slot] = self.position
+        write = ring.written
+        self._catch_up(write)
+        first = self.position % ring.slots
+        count = min(write - self.position, ring.slots - first)
+        if limit is not None:
+            count = min(count, limit)
+        self.position += count
+        return ring.records[first:first + count]
+
+    def take(self):
+        # LatestSlot-compatible: the newest unread record (a view) or None,
+        # so a RenderLoop can use a reader as its source.
+        ring = self.ring
+        write = ring.written
+        if write == self.position:
+            return None
+        self.dropped += write - self.position - 1
+        self.position = write
+        ring.cursors[self.slot] = write
+        return ring.records[(write - 1) % ring.slots]
+
+    def close(self):
+        self.ring.cursors[self.slot + 1] = 0
@@ -1,16 +1,423 @@
-import websocket, json
-from shader_visualizer import update_visualizer
+import asyncio, heapq, itertools, json, random, struct, threading, time
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+from frame_buffer import LatestSlot
+from frame_pipeline import FramePipeline
+from metrics import instrument
+from quantime_recorder import Recorder
+from shader_visualizer import HEADLESS, HeadlessRenderLoop, RenderLoop, update_visualizer
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+STREAM_URL = "wss://civilisation.one/quantum-dashboard/stream/quantime"
 AUTH_TOKEN = "your_observer_node_token"
 
-def on_message(ws, message):
-    data = json.loads(message)
-    update_visualizer(data)
-
-def start_quantime_stream():
-    ws = websocket.WebSocketApp(
-        "wss://civilisation.one/quantum-dashboard/stream/quantime",
-        header={"Authorization": f"Bearer {AUTH_TOKEN}"},
-        on_message=on_message
-    )
-    ws.run_forever()
+# Binary frame: float64 timestamp, uint64 seq, float32 entropy, float32 coherence.
+FRAME_STRUCT = struct.Struct("<dQff")
+
+DECODERS = {}
+
+def register_decoder(name):
+    def register(decode):
+        DECODERS[name] = decode
+        return decode
+    return register
+
+def get_decoder(decoder):
+    if callable(decoder):
+        return decoder
+    try:
+        return DECODERS[decoder]
+    except KeyError:
+        raise ValueError(f"unknown or unavailable decoder {decoder!r}, expected one of {sorted(DECODERS)}") from None
+
+register_decoder("json")(orjson.loads if orjson else json.loads)
+register_decoder("stdlib-json")(json.loads)
+# Hands messages through undecoded, e.g. to a FramePipeline that decodes in workers.
+register_decoder("raw")(lambda message: message)
+
+if msgpack:
+    @register_decoder("msgpack")
+    def decode_msgpack(message):
+        return msgpack.unpackb(message)
+
+@register_decoder("binary")
+def decode_binary(message, offset=0):
+    timestamp, seq, entropy, coherence = FRAME_STRUCT.unpack_from(message, offset)
+    return {"timestamp": timestamp, "seq": seq, "entropy": entropy, "coherence": coherence}
+
+def encode_binary(timestamp, seq, entropy, coherence):
+    return FRAME_STRUCT.pack(timestamp, seq, entropy, coherence)
+
+@register_decoder("auto")
+def decode_auto(message):
+    if isinstance(message, str):
+        return DECODERS["json"](message)
+    if len(message) == FRAME_STRUCT.size:
+        return decode_binary(message)
+    return DECODERS["msgpack" if msgpack else "json"](message)
+
+latest = LatestSlot()
+
+class QuantimeStream:
+    def __init__(self, url=STREAM_URL, token=AUTH_TOKEN, decoder="auto", reconnect=True,
+                 backoff=0.05, max_backoff=10.0, ping_interval=5.0, ping_timeout=5.0, source=None, tracer=None,
+                 max_queue=16, close_timeout=0.5):
+        self.url = url
+        self.token = token
+        self.source = source or url
+        self.decode = get_decoder(decoder)
+        self.reconnect = reconnect
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_queue = max_queue
+        self.close_timeout = close_timeout
+        self.tracer = tracer
+        self.last_seq = None
+        self.reconnects = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.resets = 0
+        self.messages = 0
+        self.bytes = 0
+        self.decode_errors = 0
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def backoff_delays(self):
+        # Full jitter: the first retry happens within `backoff` seconds and
+        # the ceiling doubles per failed attempt up to `max_backoff`.
+        delay = self.backoff
+        while True:
+            yield random.uniform(0, delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    async def connect(self):
+        # max_queue bounds the frames websockets buffers before it stops
+        # reading the socket, which pushes back on the server over TCP. A
+        # server still flushing a backlog rarely answers the closing
+        # handshake in time, so close_timeout bounds how long Ctrl-C, a
+        # window close or a cancel waits before the connection is dropped.
+        ws = await connect(self.url, additional_headers=self.headers, max_queue=self.max_queue,
+                           ping_interval=self.ping_interval, ping_timeout=self.ping_timeout,
+                           close_timeout=self.close_timeout)
+        if self.last_seq is not None:
+            await ws.send(json.dumps({"resume_from": self.last_seq}))
+        return ws
+
+    async def __aiter__(self):
+        delays = self.backoff_delays()
+        tracer = self.tracer
+        while True:
+            try:
+                async with await self.connect() as ws:
+                    resume, first, fresh = self.last_seq, True, True
+                    async for message in ws:
+                        if fresh:
+                            # Only a connection that delivers something resets
+                            # the backoff, so a server that accepts and closes
+                            # at once (bad token, overload) is still backed off.
+                            delays = self.backoff_delays()
+                            fresh = False
+                        if tracer:
+                            tracer.received()
+                        self.messages += 1
+                        self.bytes += len(message)
+                        try:
+                            data = self.decode(message)
+                        except Exception:
+                            # One malformed message should not cost the connection.
+                            self.decode_errors += 1
+                            continue
+                        if tracer:
+                            tracer.decoded()
+                        seq = data.get("seq") if isinstance(data, dict) else None
+                        if seq is not None:
+                            if first and resume is not None and seq < resume:
+                                # The endpoint restarted its sequence instead
+                                # of resuming: start over rather than drop
+                                # everything below the old position.
+                                self.resets += 1
+                                self.last_seq = None
+                            first = False
+                            if self.last_seq is not None:
+                                if seq <= self.last_seq:
+                                    self.duplicates += 1
+                                    continue
+                                self.gaps += seq - self.last_seq - 1
+                            self.last_seq = seq
+                        yield data
+            except (OSError, WebSocketException):
+                if not self.reconnect:
+                    raise
+            else:
+                if not self.reconnect:
+                    return
+            self.reconnects += 1
+            await asyncio.sleep(next(delays))
+
+class FanIn:
+    # Merges many sources on one event loop into a single stream ordered by
+    # timestamp, with each frame tagged frame["source"]. It is a k-way heap
+    # merge: the oldest buffered frame is released once every unfinished
+    # source has a frame buffered, or once it has waited `lateness` seconds,
+    # so one quiet source delays the merge by at most `lateness`. A frame
+    # older than one already released is still delivered and counted in
+    # `late`. An error from any source ends the merge and is raised.
+    def __init__(self, streams, lateness=0.05):
+        self.streams = list(streams)
+        self.lateness = lateness
+        self.late = 0
+
+    async def __aiter__(self):
+        count = len(self.streams)
+        heap, pending, finished = [], [0] * count, [False] * count
+        order = itertools.count()
+        arrived = asyncio.Event()
+        empty = count
+        released = float("-inf")
+        errors = []
+
+        async def pump(index, stream):
+            nonlocal empty
+            source = getattr(stream, "source", index)
+            try:
+                async for data in stream:
+                    data["source"] = source
+                    timestamp = data.get("timestamp")
+                    if timestamp is None:
+                        timestamp = data["timestamp"] = time.time()
+                    heapq.heappush(heap, (timestamp, next(order), index, time.perf_counter(), data))
+                    if not pending[index]:
+                        empty -= 1
+                    pending[index] += 1
+                    arrived.set()
+            except Exception as exc:
+                errors.append(exc)
+                raise
+            finally:
+                finished[index] = True
+                if not pending[index]:
+                    empty -= 1
+                arrived.set()
+
+        tasks = [asyncio.create_task(pump(i, stream)) for i, stream in enumerate(self.streams)]
+        try:
+            while True:
+                if errors:
+                    raise errors[0]
+                now = time.perf_counter()
+                while heap and (not empty or now - heap[0][3] >= self.lateness):
+                    timestamp, _, index, _, data = heapq.heappop(heap)
+                    pending[index] -= 1
+                    if not pending[index] and not finished[index]:
+                        empty += 1
+                    if timestamp < released:
+                        self.late += 1
+                    else:
+                        released = timestamp
+                    yield data
+                    now = time.perf_counter()
+                if all(finished) and not heap:
+                    return
+                arrived.clear()
+                timeout = self.lateness - (now - heap[0][3]) if heap else None
+                # Not wait_for: on 3.11 it swallows a cancel that lands while
+                # the event is being set, so the merge would never stop.
+                waiter = asyncio.ensure_future(arrived.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=timeout)
+                finally:
+                    waiter.cancel()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def fan_in(sources, lateness=0.05, **options):
+    # sources: iterable of {"url": ..., "token": ..., "source": ...} dicts.
+    return FanIn([QuantimeStream(**{**options, **source}) for source in sources], lateness)
+
+async def _drain(buffer, ready, stopped, handler):
+    loop = asyncio.get_running_loop()
+    while True:
+        await ready.wait()
+        ready.clear()
+        while (data := buffer.take()) is not None:
+            await loop.run_in_executor(None, handler, data)
+        if stopped.is_set():
+            return
+
+async def run_quantime_stream(stream=None, handler=update_visualizer, buffer=None, sinks=(), tracer=None):
+    # The reader only overwrites the buffer; the handler runs in a worker
+    # thread and sees the newest frame (or queued frames) once it is free, so
+    # bursts faster than the handler coalesce instead of backing up the socket.
+    # With handler=None the buffer is left to an external consumer such as a
+    # RenderLoop. Sinks (e.g. a Recorder) see every frame on the reader and
+    # must not block. A latency.LatencyTracer gets its enqueue stamp here.
+    if stream is None:
+        stream = QuantimeStream()
+    buffer = latest if buffer is None else buffer
+    if handler is None:
+        async for data in stream:
+            for sink in sinks:
+                sink(data)
+            if tracer:
+                tracer.enqueued(data)
+            buffer.put(data)
+        return
+    ready, stopped = asyncio.Event(), asyncio.Event()
+    consumer = asyncio.create_task(_drain(buffer, ready, stopped, handler))
+    reader = asyncio.current_task()
+
+    def failed(task):
+        # A handler error would otherwise only surface when the stream ends,
+        # which with reconnects is never.
+        if not task.cancelled() and task.exception() is not None:
+            reader.cancel()
+
+    consumer.add_done_callback(failed)
+    try:
+        async for data in stream:
+            for sink in sinks:
+                sink(data)
+            if tracer:
+                tracer.enqueued(data)
+            buffer.put(data)
+            ready.set()
+    except asyncio.CancelledError:
+        if consumer.done() and not consumer.cancelled() and consumer.exception() is not None:
+            if hasattr(reader, "uncancel"):
+                reader.uncancel()
+            raise consumer.exception()
+        consumer.cancel()
+        raise
+    except BaseException:
+        consumer.cancel()
+        raise
+    stopped.set()
+    ready.set()
+    await consumer
+
+class StreamThread(threading.Thread):
+    # Runs run_quantime_stream on its own event loop so the main thread stays
+    # free for the RenderLoop. stop() cancels the stream from any thread;
+    # `on_exit` is called when the stream ends, however it ends, and `error`
+    # holds what it raised.
+    def __init__(self, stream, buffer, sinks=(), tracer=None):
+        super().__init__(name="quantime-stream", daemon=True)
+        self.stream = stream
+        self.buffer = buffer
+        self.sinks = sinks
+        self.tracer = tracer
+        self.on_exit = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._task = None
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            pass
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            if self.on_exit is not None:
+                self.on_exit()
+
+    async def _main(self):
+        with self._lock:
+            if self._stopping:
+                return
+            self._task = asyncio.current_task()
+            self._loop = asyncio.get_running_loop()
+        try:
+            await run_quantime_stream(self.stream, None, self.buffer, self.sinks, self.tracer)
+        finally:
+            with self._lock:
+                self._task = None
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            if self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+def start_quantime_stream(stream=None, fps=60.0, report_interval=0.0, export_dir=None, export_interval=1.0,
+                          record=None, fsync="interval", sinks=(), workers=0, ring=None, tracer=None,
+                          metrics=None, buffer=None, history=None, tiles=None, shaders=None):
+    # With workers > 0 the reader only forwards raw messages to a
+    # FramePipeline; decoding and the sinks run off the event loop, in worker
+    # processes and the pipeline's collector thread respectively. A custom
+    # stream must then yield raw messages (QuantimeStream(decoder="raw")).
+    # With a shm_ring.RecordRing, frames are written into the ring instead of
+    # `latest` and the renderer reads it as consumer 0; analytics processes
+    # can attach to the other consumer slots by ring name. A tracer only sees
+    # receive and enqueue when workers decode (frames are matched to the
+    # render side by object or seq, and raw messages carry neither). A
+    # metrics.Registry gets the stream, buffer, renderer and pipeline
+    # counters registered on it. `buffer` replaces `latest` as the renderer's
+    # source, e.g. a frame_buffer.make_buffer() shedding policy. A
+    # shader_visualizer.History is fed every frame as a sink and drawn as a
+    # waterfall by the renderer; a StreamStates likewise, drawn as one tile
+    # per source. A shader_visualizer.ShaderManager caches the renderer's
+    # program binaries and, when watching, reloads edits to the shader.
+    target = ring or (latest if buffer is None else buffer)
+    source = ring.reader(0) if ring else target
+    if HEADLESS:
+        render = HeadlessRenderLoop(source, export_dir=export_dir, export_interval=export_interval,
+                                    fps=fps, report_interval=report_interval, tracer=tracer, history=history,
+                                    tiles=tiles, shaders=shaders)
+    else:
+        render = RenderLoop(source, fps=fps, report_interval=report_interval, tracer=tracer, history=history,
+                            tiles=tiles, shaders=shaders, export_dir=export_dir, export_interval=export_interval)
+    recorder = Recorder(record, fsync=fsync) if record else None
+    sinks = [*sinks, recorder] if recorder else list(sinks)
+    sinks += [sink for sink in (history, tiles) if sink is not None]
+    pipeline = None
+    if workers:
+        stages = sinks
+
+        def deliver(frame):
+            for sink in stages:
+                sink(frame)
+            target.put(frame)
+
+        pipeline = FramePipeline(deliver, workers=workers).start()
+        if stream is None:
+            stream = QuantimeStream(decoder="raw", tracer=tracer)
+        sinks = []
+    if stream is None:
+        stream = QuantimeStream(tracer=tracer)
+    if metrics is not None:
+        instrument(metrics, stream, source, render, pipeline, recorder, ring, tracer)
+    streamer = StreamThread(stream, pipeline or target, sinks, tracer)
+    streamer.on_exit = render.stop
+    streamer.start()
+    try:
+        render.run()
+    finally:
+        streamer.stop()
+        streamer.join()
+        if ring:
+            source.close()
+        if pipeline:
+            pipeline.close()
+        if recorder:
+            recorder.close()
+    if streamer.error is not None:
+        raise streamer.error
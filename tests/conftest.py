@@ -0,0 +1,6 @@
+import os, sys
+
+# The stream tools are top-level modules; shader_visualizer picks its GL
+# platform at import, and the tests never open a window.
+os.environ.setdefault("QUANTIME_HEADLESS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
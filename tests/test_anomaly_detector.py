@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from anomaly_detector import AnomalyDetector, AnomalyEvent, FieldDetector, format_event
+from quantime_recorder import Recorder
+
+def series(n=6000, seed=3):
+    # Noisy baseline with two coherence collapses and an entropy spike.
+    rng = np.random.default_rng(seed)
+    entropy = 0.5 + rng.normal(0, 0.02, n)
+    coherence = 0.8 + rng.normal(0, 0.02, n)
+    coherence[2000:2100] *= 0.2
+    coherence[4000:4030] *= 0.5
+    entropy[3000:3050] += 0.3
+    return np.arange(n) * 0.01 + 1.7e9, np.arange(n), entropy, coherence
+
+def live(detector, timestamps, seqs, entropy, coherence):
+    for timestamp, seq, e, c in zip(timestamps.tolist(), seqs.tolist(), entropy.tolist(), coherence.tolist()):
+        detector({"timestamp": timestamp, "seq": seq, "entropy": e, "coherence": c})
+    return list(detector.events)
+
+def key(event):
+    return event.seq, event.field, event.kind
+
+def assert_same_events(streamed, batch):
+    assert len(streamed) == len(batch) > 0
+    for a, b in zip(sorted(streamed, key=key), sorted(batch, key=key)):
+        assert key(a) == key(b)
+        assert a.timestamp == b.timestamp and a.value == b.value
+        assert a.score == pytest.approx(b.score, rel=1e-6, abs=1e-6)
+
+def test_live_and_batch_report_the_same_events():
+    timestamps, seqs, entropy, coherence = series()
+    streamed = live(AnomalyDetector(history=10000), timestamps, seqs, entropy, coherence)
+    batch = AnomalyDetector().backtest(timestamps, seqs, entropy=entropy, coherence=coherence)
+    assert_same_events(streamed, batch)
+    assert {event.kind for event in streamed} == {"zscore", "cusum", "changepoint"}
+    assert {event.field for event in streamed} == {"entropy", "coherence"}
+
+@pytest.mark.parametrize("direction", ["up", "down", "both"])
+def test_field_detector_parity_per_direction(direction):
+    values = series()[3]
+    detector = FieldDetector(direction, window=128, cp_window=32)
+    streamed = [(i, kind, score) for i, value in enumerate(values.tolist())
+                for kind, score in detector.update(value)]
+    batch = FieldDetector(direction, window=128, cp_window=32).batch(values)
+    assert [(i, kind) for i, kind, _ in sorted(streamed)] == [(i, kind) for i, kind, _ in sorted(batch)]
+    for (_, _, a), (_, _, b) in zip(sorted(streamed), sorted(batch)):
+        assert a == pytest.approx(b, rel=1e-6, abs=1e-6)
+
+def test_backtest_recording_matches_live(tmp_path):
+    timestamps, seqs, entropy, coherence = series()
+    path = str(tmp_path / "session.qtm")
+    with Recorder(path) as recorder:
+        for timestamp, seq, e, c in zip(timestamps.tolist(), seqs.tolist(), entropy.tolist(), coherence.tolist()):
+            recorder({"timestamp": timestamp, "seq": seq, "entropy": e, "coherence": c})
+    # The recording stores float32 values; the live side sees the same.
+    entropy32, coherence32 = entropy.astype(np.float32), coherence.astype(np.float32)
+    streamed = live(AnomalyDetector(history=10000), timestamps, seqs, entropy32, coherence32)
+    assert_same_events(streamed, AnomalyDetector().backtest_recording(path))
+
+def test_sources_keep_separate_baselines():
+    timestamps, seqs, entropy, coherence = series()
+    detector = AnomalyDetector(history=10000)
+    quiet = 0.5 + np.random.default_rng(9).normal(0, 0.02, len(seqs))
+    for i in range(len(seqs)):
+        detector({"source": "a", "seq": int(seqs[i]), "entropy": float(entropy[i]), "coherence": float(coherence[i])})
+        detector({"source": "b", "seq": int(seqs[i]), "entropy": float(quiet[i]), "coherence": 0.8})
+    alone = live(AnomalyDetector(history=10000), timestamps, seqs, entropy, coherence)
+    from_a = [event for event in detector.events if event.source == "a"]
+    assert [key(event) for event in from_a] == [key(event) for event in alone]
+
+def test_format_event_without_seq_or_timestamp():
+    event = AnomalyEvent("zscore", "coherence", None, None, 0.1, -5.0)
+    assert format_event(event) == "zscore      coherence value=0.1000 score=-5.00"
+    event = AnomalyEvent("cusum", "entropy", 7, 1.5, 0.9, 16.0, "node-a")
+    assert format_event(event) == "cusum       entropy   source=node-a seq=7 t=1.500000 value=0.9000 score=+16.00"
@@ -0,0 +1,78 @@
+import json, os, signal, time
+import pytest
+from frame_pipeline import FramePipeline, decode_frame
+
+def message(seq, **extra):
+    return json.dumps({"seq": seq, "entropy": 0.5, "coherence": 0.5, **extra})
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def inflate(raw):
+    # Results for frames flagged "big" do not fit a result slot.
+    frame = decode_frame(raw)
+    if frame.get("big"):
+        frame["pad"] = "x" * 4096
+    return frame
+
+def test_results_are_delivered_in_submission_order():
+    delivered = []
+    with FramePipeline(delivered.append, workers=3) as pipeline:
+        for seq in range(3000):
+            pipeline.submit(message(seq))
+        wait_until(lambda: pipeline.delivered + pipeline.shed == 3000)
+    assert [frame["seq"] for frame in delivered] == sorted(frame["seq"] for frame in delivered)
+    assert len(delivered) == 3000 - pipeline.shed
+    assert pipeline.errors == 0
+
+def test_oversize_frames_are_shed_without_stalling():
+    delivered = []
+    with FramePipeline(delivered.append, workers=2, slot_size=256) as pipeline:
+        for seq in range(100):
+            accepted = pipeline.submit(message(seq, pad="x" * 512 if seq == 10 else ""))
+            assert accepted == (seq != 10)
+        wait_until(lambda: pipeline.delivered == 99)
+    assert [frame["seq"] for frame in delivered] == [seq for seq in range(100) if seq != 10]
+    assert (pipeline.oversize, pipeline.shed) == (1, 1)
+
+def test_undecodable_and_oversize_results_count_as_errors():
+    delivered = []
+    with FramePipeline(delivered.append, process=inflate, workers=2, result_size=512) as pipeline:
+        for seq in range(50):
+            pipeline.submit("not json" if seq == 5 else message(seq, big=seq == 7))
+        wait_until(lambda: pipeline.delivered + pipeline.errors == 50)
+    assert [frame["seq"] for frame in delivered] == [seq for seq in range(50) if seq not in (5, 7)]
+    assert pipeline.errors == 2
+
+def test_dead_worker_is_skipped_and_its_frames_accounted():
+    delivered = []
+    with FramePipeline(delivered.append, workers=2) as pipeline:
+        for seq in range(100):
+            pipeline.submit(message(seq))
+        wait_until(lambda: pipeline.delivered == 100)
+        os.kill(pipeline.processes[0].pid, signal.SIGKILL)
+        pipeline.processes[0].join(5.0)
+        for seq in range(100, 1100):
+            pipeline.submit(message(seq))
+        wait_until(lambda: pipeline.delivered + pipeline.errors + pipeline.shed == 1100)
+        assert pipeline.alive == [False, True]
+    seqs = [frame["seq"] for frame in delivered]
+    assert seqs == sorted(seqs)
+    assert seqs[:100] == list(range(100))
+    # Once the worker is reaped every frame goes to the survivor.
+    assert seqs[-1] == 1099
+
+def test_deliver_error_is_raised_by_the_next_submit():
+    def deliver(frame):
+        if frame["seq"] == 5:
+            raise KeyError("sink failed")
+
+    with FramePipeline(deliver, workers=2) as pipeline:
+        with pytest.raises(KeyError, match="sink failed"):
+            for seq in range(10000):
+                pipeline.submit(message(seq))
+                time.sleep(0.001)
+        assert pipeline.delivered == 6
@@ -0,0 +1,39 @@
+import asyncio, math
+from quantime_recorder import Recorder, read_recording
+from quantime_replay import ReplaySource
+
+async def replay(path):
+    return [frame async for frame in ReplaySource(path, speed=0)]
+
+def test_round_trip_and_seq_defaults(tmp_path):
+    path = str(tmp_path / "session.qtm")
+    with Recorder(path) as recorder:
+        recorder({"timestamp": 10.0, "entropy": 0.25, "coherence": 0.5})
+        recorder({"timestamp": 11.0, "seq": 40, "entropy": 0.5, "coherence": 0.75, "extras": [1.0, 2.0]})
+        recorder({"timestamp": 12.0, "entropy": 0.75, "coherence": 1.0})
+    records = read_recording(path)
+    assert records["seq"].tolist() == [0, 40, 41]
+    assert records["entropy"].tolist() == [0.25, 0.5, 0.75]
+    assert records["extras"][1].tolist()[:2] == [1.0, 2.0] and math.isnan(records["extras"][1][2])
+    frames = asyncio.run(replay(path))
+    assert [frame["timestamp"] for frame in frames] == [10.0, 11.0, 12.0]
+
+def test_bad_frames_are_skipped_without_stopping_the_writer(tmp_path):
+    path = str(tmp_path / "session.qtm")
+    recorder = Recorder(path, flush_interval=0.01)
+    recorder({"entropy": 0.1, "coherence": 0.2})
+    for bad in ({"type": "hello"}, None, {"entropy": None, "coherence": 1.0}, [1, 2]):
+        recorder(bad)
+    recorder({"entropy": 0.3, "coherence": 0.4})
+    recorder.close()
+    assert (recorder.written, recorder.skipped, recorder.write_errors) == (2, 4, 0)
+    assert read_recording(path)["seq"].tolist() == [0, 1]
+
+def test_writer_survives_and_keeps_recording(tmp_path):
+    path = str(tmp_path / "session.qtm")
+    recorder = Recorder(path, flush_interval=0.01)
+    recorder({"type": "hello"})
+    for seq in range(100):
+        recorder({"seq": seq, "entropy": 0.5, "coherence": 0.5})
+    recorder.close()
+    assert recorder.written == 100 and not recorder._pending
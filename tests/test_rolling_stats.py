@@ -0,0 +1,74 @@
+import math
+import numpy as np
+import pytest
+from rolling_stats import Ewma, RollingWindow, SourceStats, StreamStats
+
+def feed(window, values, rng):
+    # Mixes single adds with blocks of varying size, including ones larger
+    # than the window.
+    i = 0
+    while i < len(values):
+        size = max(1, int(rng.choice([1, 1, 3, 17, window.size - 1, window.size + 5])))
+        chunk = values[i:i + size]
+        if len(chunk) == 1:
+            window.add(float(chunk[0]))
+        else:
+            window.add_block(chunk)
+        i += len(chunk)
+        yield values[max(0, i - window.size):i]
+
+@pytest.mark.parametrize("size", [1, 7, 100])
+def test_rolling_window_matches_brute_force(size):
+    rng = np.random.default_rng(size)
+    values = np.clip(rng.normal(0.5, 0.15, 5000), 0.0, 1.0)
+    window = RollingWindow(size, bins=1024)
+    for expected in feed(window, values, rng):
+        assert window.count == len(expected)
+        assert window.mean == pytest.approx(expected.mean(), abs=1e-9)
+        assert window.std == pytest.approx(expected.std(ddof=1) if len(expected) > 1 else 0.0, abs=1e-7)
+        assert window.min == expected.min()
+        assert window.max == expected.max()
+        for q in (50, 95, 99):
+            # Accurate to one histogram bin.
+            assert abs(window.percentile(q) - np.percentile(expected, q, method="lower")) <= 1.0 / 1024
+
+def test_rolling_window_drifting_values_stay_accurate():
+    # Long runs far from zero are where sliding Welford updates drift.
+    values = 1e3 + np.sin(np.arange(200000) * 0.01)
+    window = RollingWindow(1000, lo=999.0, hi=1001.0)
+    window.add_block(values)
+    assert window.mean == pytest.approx(values[-1000:].mean(), abs=1e-9)
+    assert window.std == pytest.approx(values[-1000:].std(ddof=1), rel=1e-6)
+
+def test_empty_window():
+    window = RollingWindow(10)
+    assert window.count == 0
+    assert math.isnan(window.min) and math.isnan(window.max) and math.isnan(window.percentile(50))
+
+def test_ewma_block_matches_single_updates():
+    values = np.random.default_rng(1).random(1000)
+    single, block = Ewma(0.1), Ewma(0.1)
+    for value in values:
+        single.add(float(value))
+    block.add_block(values[:300])
+    block.add_block(values[300:])
+    assert block.value == pytest.approx(single.value, rel=1e-9)
+
+def test_stream_stats_reports_per_source():
+    reports = []
+    stats = SourceStats(on_report=lambda source, summary: reports.append((source, summary)),
+                        windows=(10,), block=5, report_interval=0.0)
+    for i in range(20):
+        stats({"source": "a", "entropy": 0.25, "coherence": 0.5})
+        stats({"source": "b", "entropy": 0.75, "coherence": 0.5})
+    assert {source for source, _ in reports} == {"a", "b"}
+    assert stats.stats["a"].summary()["entropy"][10]["mean"] == pytest.approx(0.25)
+    assert stats.stats["b"].summary()["entropy"][10]["mean"] == pytest.approx(0.75)
+
+def test_stream_stats_flushes_pending_frames():
+    stats = StreamStats(windows=(100,), block=1000, max_delay=3600)
+    for value in (0.1, 0.2, 0.3):
+        stats({"entropy": value, "coherence": value})
+    assert stats.summary()["entropy"][100]["count"] == 0
+    stats.flush()
+    assert stats.summary()["entropy"][100]["mean"] == pytest.approx(0.2)
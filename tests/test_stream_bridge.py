@@ -0,0 +1,154 @@
+import asyncio, time
+import pytest
+from websockets.asyncio.server import serve
+from frame_buffer import BoundedQueue
+from quantime_recorder import Recorder
+from quantime_replay import ReplaySource
+from quantime_simulator import QuantimeSimulator
+from stream_bridge import FanIn, QuantimeStream, run_quantime_stream
+
+def run(coro, timeout=20.0):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+async def take(stream, count):
+    frames = []
+    async for data in stream:
+        frames.append(data)
+        if len(frames) == count:
+            break
+    return frames
+
+async def simulate(simulator, count, **options):
+    async with simulator:
+        stream = QuantimeStream(simulator.url, "token", backoff=0.01, **options)
+        return stream, await take(stream, count)
+
+class Restarting(QuantimeSimulator):
+    # Ignores resume_from: every connection starts over at seq 0.
+    async def resume_point(self, ws):
+        await super().resume_point(ws)
+        return 0
+
+class Overlapping(QuantimeSimulator):
+    # Resends the last frame the client saw before continuing.
+    async def resume_point(self, ws):
+        return max(await super().resume_point(ws) - 1, 0)
+
+class Skipping(QuantimeSimulator):
+    # Loses 10 frames on every reconnect.
+    async def resume_point(self, ws):
+        start = await super().resume_point(ws)
+        return start + 10 if start else 0
+
+def test_reconnect_resumes_after_last_seq():
+    stream, frames = run(simulate(QuantimeSimulator(port=0, rate=5000, close_after=100), 450))
+    assert [frame["seq"] for frame in frames] == list(range(450))
+    assert stream.reconnects >= 4
+    assert (stream.gaps, stream.duplicates, stream.resets) == (0, 0, 0)
+
+def test_restarted_sequence_counts_a_reset():
+    stream, frames = run(simulate(Restarting(port=0, rate=5000, close_after=100), 250))
+    assert [frame["seq"] for frame in frames] == [*range(100), *range(100), *range(50)]
+    assert stream.resets == 2
+    assert stream.duplicates == 0
+
+def test_replayed_frames_are_dropped_as_duplicates():
+    stream, frames = run(simulate(Overlapping(port=0, rate=5000, close_after=100), 350))
+    assert [frame["seq"] for frame in frames] == list(range(350))
+    assert stream.duplicates == stream.reconnects >= 3
+    assert stream.resets == 0
+
+def test_lost_frames_are_counted_as_gaps():
+    stream, frames = run(simulate(Skipping(port=0, rate=5000, close_after=100), 250))
+    seqs = [frame["seq"] for frame in frames]
+    assert seqs == sorted(seqs)
+    assert stream.gaps == 10 * stream.reconnects > 0
+
+def test_backoff_grows_while_connections_deliver_nothing():
+    connections = 0
+
+    async def refuse(ws):
+        nonlocal connections
+        connections += 1
+        await ws.close(1008, "bad token")
+
+    async def main():
+        async with serve(refuse, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            stream = QuantimeStream(f"ws://127.0.0.1:{port}", "token", backoff=0.05, max_backoff=0.4)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(take(stream, 1), 1.5)
+
+    run(main())
+    # Without backoff this is ~60 connections (one per 25 ms on average).
+    assert 2 <= connections < 20
+
+def test_binary_frames_round_trip():
+    stream, frames = run(simulate(QuantimeSimulator(port=0, rate=5000, fmt="binary"), 50))
+    assert [frame["seq"] for frame in frames] == list(range(50))
+    assert stream.decode_errors == 0
+
+class Source:
+    def __init__(self, source, timestamps, delay=0.001, hang=False):
+        self.source = source
+        self.timestamps = timestamps
+        self.delay = delay
+        self.hang = hang
+
+    async def __aiter__(self):
+        for timestamp in self.timestamps:
+            await asyncio.sleep(self.delay)
+            yield {"timestamp": timestamp, "entropy": 0.5, "coherence": 0.5}
+        if self.hang:
+            await asyncio.sleep(3600)
+
+def test_fan_in_merges_by_timestamp():
+    sources = [Source("a", range(0, 300, 3)), Source("b", range(1, 300, 3), delay=0.002),
+               Source("c", range(2, 300, 3), delay=0.0)]
+    fan = FanIn(sources, lateness=1.0)
+    frames = run(take(fan, 300))
+    assert [frame["timestamp"] for frame in frames] == list(range(300))
+    assert [frame["source"] for frame in frames[:3]] == ["a", "b", "c"]
+    assert fan.late == 0
+
+def test_fan_in_ends_when_every_source_ends():
+    frames = run(take(FanIn([Source("a", [1, 2]), Source("b", [])]), 10))
+    assert [frame["timestamp"] for frame in frames] == [1, 2]
+
+def test_fan_in_does_not_wait_on_a_quiet_source():
+    fan = FanIn([Source("a", range(20)), Source("quiet", [], hang=True)], lateness=0.02)
+    started = time.perf_counter()
+    frames = run(take(fan, 20), timeout=5.0)
+    assert [frame["timestamp"] for frame in frames] == list(range(20))
+    assert time.perf_counter() - started < 2.0
+
+def test_fan_in_raises_a_failing_source():
+    class Failing:
+        source = "bad"
+
+        async def __aiter__(self):
+            yield {"timestamp": 0.0, "entropy": 0.5, "coherence": 0.5}
+            await asyncio.sleep(0.05)
+            yield [1, 2, 3]
+
+    fan = FanIn([Source("good", range(10000), hang=True), Failing()])
+    with pytest.raises(TypeError):
+        run(take(fan, 10000))
+
+def test_empty_replay_is_not_replaced_by_the_live_stream(tmp_path):
+    path = str(tmp_path / "empty.qtm")
+    Recorder(path).close()
+    buffer = BoundedQueue(16)
+    run(run_quantime_stream(ReplaySource(path, speed=0), None, buffer), timeout=5.0)
+    assert len(buffer) == 0
+
+def test_handler_error_ends_the_stream():
+    def handler(frame):
+        raise RuntimeError("handler failed")
+
+    async def main():
+        async with QuantimeSimulator(port=0, rate=1000) as simulator:
+            await run_quantime_stream(QuantimeStream(simulator.url, "token"), handler)
+
+    with pytest.raises(RuntimeError, match="handler failed"):
+        run(main())